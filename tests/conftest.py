@@ -1,5 +1,7 @@
 import sys
 import os
+
+import pytest
 from subprocess import Popen, PIPE
 
 
@@ -37,3 +39,11 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True, scope='session')
+def project_test_environment():
+    # Отдельный кэш и синхронные фоновые задачи, см. core/test_runner.py
+    from core.test_runner import test_environment
+    with test_environment():
+        yield
@@ -0,0 +1,219 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .instrumentation import record_cache
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    key TEXT PRIMARY KEY,
+    value BLOB,
+    expires REAL,
+    accessed REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed);
+CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires);
+"""
+
+LIVE = "(expires IS NULL OR expires > ?)"
+
+
+class SQLiteCache(BaseCache):
+    """Cache shared by every worker process through a local SQLite file.
+
+    The database runs in WAL mode, so readers never block the writer.
+    Integers are stored natively to make ``incr`` a single atomic UPDATE;
+    everything else is pickled. The table is bounded by ``MAX_ENTRIES``
+    and evicts the least recently used rows. Access times are refreshed
+    at most every ``LRU_RESOLUTION`` seconds to keep reads read-only.
+
+        CACHES = {"default": {
+            "BACKEND": "core.cache.SQLiteCache",
+            "LOCATION": "/var/tmp/yatube-cache.sqlite3",
+            "OPTIONS": {"MAX_ENTRIES": 100000},
+        }}
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get("OPTIONS", {})
+        self._lru_resolution = options.get("LRU_RESOLUTION", 10)
+        self._cull_every = options.get("CULL_EVERY", 100)
+        self._busy_timeout = options.get("BUSY_TIMEOUT", 5)
+        self._local = threading.local()
+        self._writes = 0
+
+    @property
+    def _db(self):
+        # One connection per thread, reopened after a fork.
+        db = getattr(self._local, "db", None)
+        if db is None or self._local.pid != os.getpid():
+            db = sqlite3.connect(self._path, timeout=self._busy_timeout,
+                                 isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(SCHEMA)
+            self._local.db, self._local.pid = db, os.getpid()
+        return db
+
+    def _encode(self, value):
+        if type(value) is int:
+            return value
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _decode(self, value):
+        if isinstance(value, int):
+            return value
+        return pickle.loads(value)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _touch_lru(self, keys, now):
+        self._db.executemany(
+            "UPDATE cache SET accessed = ? WHERE key = ?",
+            [(now, key) for key in keys]
+        )
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        if not keys:
+            return {}
+        key_map = {self._key(key, version): key for key in keys}
+        now = time.time()
+        placeholders = ",".join("?" * len(key_map))
+        rows = self._db.execute(
+            f"SELECT key, value, accessed FROM cache "
+            f"WHERE key IN ({placeholders}) AND {LIVE}",
+            [*key_map, now]
+        ).fetchall()
+        stale = [key for key, _, accessed in rows
+                 if now - accessed > self._lru_resolution]
+        if stale:
+            self._touch_lru(stale, now)
+        record_cache(len(rows), len(key_map) - len(rows))
+        return {key_map[key]: self._decode(value) for key, value, _ in rows}
+
+    def _count_writes(self, count):
+        # Cull once every CULL_EVERY rows written, however they were
+        # batched.
+        before = self._writes
+        self._writes += count
+        if self._writes // self._cull_every > before // self._cull_every:
+            self._cull()
+
+    def _write(self, sql, params):
+        cursor = self._db.execute(sql, params)
+        self._count_writes(1)
+        return cursor.rowcount
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._write(
+            "INSERT OR REPLACE INTO cache (key, value, expires, accessed) "
+            "VALUES (?, ?, ?, ?)",
+            (self._key(key, version), self._encode(value),
+             self.get_backend_timeout(timeout), time.time())
+        )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires, now = self.get_backend_timeout(timeout), time.time()
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expires, "
+                "accessed) VALUES (?, ?, ?, ?)",
+                [(self._key(key, version), self._encode(value), expires, now)
+                 for key, value in data.items()]
+            )
+        self._count_writes(len(data))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        return self._write(
+            "INSERT INTO cache (key, value, expires, accessed) "
+            "VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+            "value = excluded.value, expires = excluded.expires, "
+            "accessed = excluded.accessed "
+            "WHERE cache.expires IS NOT NULL AND cache.expires <= ?",
+            (self._key(key, version), self._encode(value),
+             self.get_backend_timeout(timeout), now, now)
+        ) == 1
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        now = time.time()
+        return self._db.execute(
+            f"UPDATE cache SET expires = ?, accessed = ? "
+            f"WHERE key = ? AND {LIVE}",
+            (self.get_backend_timeout(timeout), now,
+             self._key(key, version), now)
+        ).rowcount == 1
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            row = self._db.execute(
+                f"SELECT value FROM cache WHERE key = ? AND {LIVE}",
+                (key, now)
+            ).fetchone()
+            if row is None or not isinstance(row[0], int):
+                raise ValueError(f"Key '{key}' not found")
+            self._db.execute(
+                "UPDATE cache SET value = value + ?, accessed = ? "
+                "WHERE key = ?",
+                (delta, now, key)
+            )
+        return row[0] + delta
+
+    def has_key(self, key, version=None):
+        return self._db.execute(
+            f"SELECT 1 FROM cache WHERE key = ? AND {LIVE}",
+            (self._key(key, version), time.time())
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        self._db.execute("DELETE FROM cache WHERE key = ?",
+                         (self._key(key, version),))
+
+    def delete_many(self, keys, version=None):
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.executemany(
+                "DELETE FROM cache WHERE key = ?",
+                [(self._key(key, version),) for key in keys]
+            )
+
+    def clear(self):
+        self._db.execute("DELETE FROM cache")
+
+    def _cull(self):
+        with self._db:
+            self._db.execute("BEGIN IMMEDIATE")
+            self._db.execute("DELETE FROM cache WHERE expires <= ?",
+                             (time.time(),))
+            count, = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()
+            excess = count - self._max_entries
+            if excess > 0:
+                # Like Django's own backends, cull a fraction of the table
+                # at once instead of one row per write.
+                excess += self._max_entries // self._cull_frequency
+                self._db.execute(
+                    "DELETE FROM cache WHERE key IN (SELECT key FROM cache "
+                    "ORDER BY accessed LIMIT ?)",
+                    (excess,)
+                )
+
+    def close(self, **kwargs):
+        # Connections are kept per thread for the life of the process.
+        pass
@@ -0,0 +1,39 @@
+"""Generation counters kept in the shared cache.
+
+Cached data is stored under the current value of a counter, and a write
+bumps the counter instead of deleting the data: whatever a reader stores
+under an old value afterwards is never looked up again.
+"""
+import time
+
+from django.core.cache import cache
+
+
+def _initial():
+    # Start from the clock so an evicted counter never goes back to a
+    # value that older data was stored under.
+    return int(time.time() * 1000)
+
+
+def start(key):
+    """Start the counter at ``key`` unless another process just did, and
+    return its value."""
+    cache.add(key, _initial(), None)
+    return cache.get(key)
+
+
+def current(keys):
+    """Values of the counters at ``keys``, in one cache read unless some
+    have to be started."""
+    found = cache.get_many(keys)
+    for key in keys:
+        if key not in found:
+            found[key] = start(key)
+    return found
+
+
+def bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, _initial(), None)
@@ -0,0 +1,105 @@
+import random
+import threading
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = "primary_db"
+
+# Sessions decide who is logged in, so they are never read from a copy
+# that may lag behind.
+PRIMARY_ONLY_APPS = {"sessions"}
+
+_local = threading.local()
+
+
+def replica_reads(view):
+    """Let GET and HEAD requests to ``view`` read from the replicas.
+
+    Everything else, and every request of a client that wrote recently,
+    uses the primary, see ReplicaMiddleware.
+    """
+    view.replica_reads = True
+    return view
+
+
+class RequestState:
+    def __init__(self):
+        self.use_replicas = False
+        self.read_replica = False
+        self.wrote = False
+
+
+def current():
+    return getattr(_local, "state", None)
+
+
+def read_replica():
+    """Whether the current request has read anything from a replica."""
+    state = current()
+    return state is not None and state.read_replica
+
+
+class ReplicaRouter:
+    """Send reads of replica_reads views to DATABASE_REPLICAS.
+
+    Writes always go to the primary and pin the rest of the request to it,
+    so a view reads back what it has just written.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = current()
+        replicas = settings.DATABASE_REPLICAS
+        if (state is None or not state.use_replicas or not replicas
+                or model._meta.app_label in PRIMARY_ONLY_APPS):
+            return DEFAULT_DB_ALIAS
+        state.read_replica = True
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = current()
+        if state is not None:
+            state.wrote = True
+            state.use_replicas = False
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaMiddleware:
+    """Decide per request whether reads may go to a replica.
+
+    A response to a request that wrote anything sets a cookie that keeps
+    the client on the primary for REPLICA_MAX_LAG seconds, so users read
+    their own writes.
+    """
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = _local.state = RequestState()
+        try:
+            response = self.get_response(request)
+        finally:
+            _local.state = None
+        if state.wrote:
+            response.set_cookie(PIN_COOKIE, "1",
+                                max_age=settings.REPLICA_MAX_LAG,
+                                httponly=True, samesite="Lax")
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current().use_replicas = (
+            getattr(view_func, "replica_reads", False)
+            and request.method in ("GET", "HEAD")
+            and PIN_COOKIE not in request.COOKIES
+        )
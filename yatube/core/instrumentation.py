@@ -0,0 +1,183 @@
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+_samples = defaultdict(deque)
+_samples_lock = threading.Lock()
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budget(queries):
+    """Declare how many SQL queries a view may issue per request.
+
+    The budget is checked by InstrumentationMiddleware. Page cache hits
+    issue fewer queries, so budgets are meant for a cold cache.
+    """
+    def decorator(view):
+        view.query_budget = queries
+        return view
+    return decorator
+
+
+class Recorder:
+    """Counters for the request being served on the current thread."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.total_time = 0.0
+        self.budget = None
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.queries += 1
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.queries > self.budget
+
+    def server_timing(self):
+        return ", ".join([
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.queries} '
+            f'queries"',
+            f"tpl;dur={self.template_time * 1000:.1f}",
+            f'cache;desc="{self.cache_hits} hits {self.cache_misses} '
+            f'misses"',
+            f"total;dur={self.total_time * 1000:.1f}",
+        ])
+
+
+def current():
+    return getattr(_local, "recorder", None)
+
+
+def record_cache(hits, misses):
+    """Called by cache backends on every lookup."""
+    recorder = current()
+    if recorder is not None:
+        recorder.cache_hits += hits
+        recorder.cache_misses += misses
+
+
+def _timed_render(render):
+    def wrapper(self, *args, **kwargs):
+        recorder = current()
+        if recorder is None:
+            return render(self, *args, **kwargs)
+        # Cards and includes rendered inside a page count towards it once.
+        recorder.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            recorder.template_depth -= 1
+            if not recorder.template_depth:
+                recorder.template_time += time.perf_counter() - started
+    wrapper.instrumented = True
+    return wrapper
+
+
+def _add_sample(name, recorder):
+    window = settings.INSTRUMENTATION_WINDOW
+    with _samples_lock:
+        samples = _samples[name]
+        samples.append((recorder.total_time, recorder.queries,
+                        recorder.sql_time, recorder.template_time,
+                        recorder.cache_hits, recorder.cache_misses))
+        while len(samples) > window:
+            samples.popleft()
+
+
+def aggregate():
+    """Rolling per-URL-name summary of the last requests in this process."""
+    with _samples_lock:
+        snapshot = {name: list(samples) for name, samples in _samples.items()}
+    summary = {}
+    for name, samples in snapshot.items():
+        count = len(samples)
+        timings = sorted(sample[0] for sample in samples)
+        hits = sum(sample[4] for sample in samples)
+        lookups = hits + sum(sample[5] for sample in samples)
+        summary[name] = {
+            "requests": count,
+            "p50": timings[(count - 1) // 2] * 1000,
+            "p95": timings[int((count - 1) * 0.95)] * 1000,
+            "queries": sum(sample[1] for sample in samples) / count,
+            "sql_time": sum(sample[2] for sample in samples) / count * 1000,
+            "template_time": (sum(sample[3] for sample in samples)
+                              / count * 1000),
+            "cache_hit_ratio": hits / lookups if lookups else 0.0,
+        }
+    return summary
+
+
+def reset():
+    with _samples_lock:
+        _samples.clear()
+
+
+class InstrumentationMiddleware:
+    """Per-request SQL, template and cache counters.
+
+    Enabled by ``REQUEST_INSTRUMENTATION``. Each response gets a
+    ``Server-Timing`` header, and requests are folded into ``aggregate()``
+    by resolved URL name. Views that issue more queries than their
+    ``query_budget`` are logged, or fail if ``QUERY_BUDGET_STRICT`` is set.
+    """
+
+    def __init__(self, get_response):
+        if not settings.REQUEST_INSTRUMENTATION:
+            raise MiddlewareNotUsed
+        if not getattr(Template.render, "instrumented", False):
+            Template.render = _timed_render(Template.render)
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = _local.recorder = Recorder()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(recorder.execute)
+                    )
+                response = self.get_response(request)
+        finally:
+            _local.recorder = None
+        recorder.total_time = time.perf_counter() - recorder.started
+        response["Server-Timing"] = recorder.server_timing()
+        response.instrumentation = recorder
+        match = getattr(request, "resolver_match", None)
+        name = match.url_name if match and match.url_name else "unresolved"
+        _add_sample(name, recorder)
+        if recorder.over_budget:
+            message = (f"{name} issued {recorder.queries} queries, "
+                       f"budget is {recorder.budget}")
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current().budget = getattr(view_func, "query_budget", None)
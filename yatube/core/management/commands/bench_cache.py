@@ -0,0 +1,74 @@
+import os
+import statistics
+import tempfile
+import time
+from multiprocessing import Pool
+
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+
+from core.cache import SQLiteCache
+
+PAGE = b"x" * 20000
+
+
+def make_backend(name, path):
+    params = {"OPTIONS": {"MAX_ENTRIES": 10 ** 6}}
+    if name == "locmem":
+        return LocMemCache("bench", params)
+    return SQLiteCache(path, params)
+
+
+def run_ops(args):
+    name, path, operations, keys, worker = args
+    cache = make_backend(name, path)
+    counter = f"counter:{worker}"
+    cache.set(counter, 0)
+    results = {}
+    started = time.perf_counter()
+    for i in range(operations):
+        cache.set(f"page:{worker}:{i % keys}", PAGE)
+    results["set"] = time.perf_counter() - started
+    started = time.perf_counter()
+    for i in range(operations):
+        cache.get(f"page:{worker}:{i % keys}")
+    results["get"] = time.perf_counter() - started
+    started = time.perf_counter()
+    for i in range(operations):
+        cache.incr(counter)
+    results["incr"] = time.perf_counter() - started
+    return results
+
+
+class Command(BaseCommand):
+    help = "Compare throughput of LocMemCache and core.cache.SQLiteCache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--operations", type=int, default=5000)
+        parser.add_argument("--keys", type=int, default=500)
+        parser.add_argument("--processes", type=int, default=4,
+                            help="Concurrent workers for the shared backend.")
+
+    def report(self, label, results, operations):
+        for op in ("get", "set", "incr"):
+            total = operations * len(results)
+            elapsed = statistics.mean(result[op] for result in results)
+            self.stdout.write(
+                f"{label:<22} {op:<5} {total / elapsed:>12,.0f} ops/s"
+            )
+
+    def handle(self, *args, **options):
+        operations, keys = options["operations"], options["keys"]
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "cache.sqlite3")
+            for name in ("locmem", "sqlite"):
+                results = [run_ops((name, path, operations, keys, 0))]
+                self.report(f"{name} x1", results, operations)
+            processes = options["processes"]
+            if processes > 1:
+                with Pool(processes) as pool:
+                    results = pool.map(run_ops, [
+                        ("sqlite", path, operations, keys, worker)
+                        for worker in range(processes)
+                    ])
+                self.report(f"sqlite x{processes}", results, operations)
@@ -0,0 +1,74 @@
+import random
+import threading
+import time
+import types
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+from django.db import transaction
+
+# One writer at a time per process: threads queue on this lock instead of
+# spinning in SQLite's busy handler, so the busy timeout only covers the
+# other processes.
+_write_lock = threading.RLock()
+_local = threading.local()
+
+
+def configure_connection(sender, connection, **kwargs):
+    """Apply SQLITE_PRAGMAS to every new SQLite connection.
+
+    Connected to ``connection_created`` in CoreConfig.ready. The
+    connection also learns to open write transactions with BEGIN
+    IMMEDIATE, see write_transaction.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+    connection._start_transaction_under_autocommit = types.MethodType(
+        _begin, connection
+    )
+
+
+def _begin(connection):
+    # A deferred transaction that reads before it writes cannot wait for
+    # the write lock: SQLite fails it at once with "database is locked"
+    # rather than risk a deadlock. Taking the lock up front lets the busy
+    # timeout apply.
+    immediate = getattr(_local, "immediate", False)
+    connection.cursor().execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+
+
+def is_locked(error):
+    return isinstance(error, OperationalError) and "locked" in str(error)
+
+
+def write_transaction(func, *args, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Call ``func`` in a write transaction behind the process write gate.
+
+    The transaction starts with BEGIN IMMEDIATE. If the database is still
+    locked by another process after the busy timeout, it is rolled back
+    and ``func`` is called again up to SQLITE_WRITE_RETRIES times, after
+    a jittered exponential backoff. With SQLITE_WRITE_GATE off ``func``
+    is simply called.
+    """
+    if (not settings.SQLITE_WRITE_GATE
+            or connections[using].vendor != "sqlite"
+            or getattr(_local, "immediate", False)):
+        return func(*args, **kwargs)
+    for attempt in range(settings.SQLITE_WRITE_RETRIES + 1):
+        try:
+            with _write_lock:
+                _local.immediate = True
+                try:
+                    with transaction.atomic(using=using):
+                        return func(*args, **kwargs)
+                finally:
+                    _local.immediate = False
+        except OperationalError as error:
+            if (not is_locked(error)
+                    or attempt == settings.SQLITE_WRITE_RETRIES):
+                raise
+        time.sleep(settings.SQLITE_WRITE_BACKOFF * 2 ** attempt
+                   * random.uniform(0.5, 1.5))
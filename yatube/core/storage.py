@@ -0,0 +1,64 @@
+import hashlib
+import os
+import posixpath
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File storage that names every file after the SHA-256 of its content.
+
+    ``posts/cat.jpg`` is stored as ``posts/ab/cd/abcd....jpg``, so the same
+    upload is kept once however many times it is saved, and saving never
+    scans the directory for a free name. Uploads are hashed chunk by chunk
+    while they are written to a temporary file, which is then moved into
+    place. Saving content that is already stored refreshes the blob's
+    mtime, so a sweeper can tell it is about to be referenced again;
+    deleting a blob that is still referenced is up to the caller.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is only known once the content is hashed.
+        return name
+
+    def _temporary_path(self):
+        os.makedirs(self.location, exist_ok=True)
+        return os.path.join(self.location, f".upload-{uuid.uuid4().hex}")
+
+    def _save(self, name, content):
+        temporary = self._temporary_path()
+        digest = hashlib.sha256()
+        try:
+            fd = os.open(temporary, self.OS_OPEN_FLAGS, 0o666)
+            with os.fdopen(fd, "wb") as output:
+                for chunk in content.chunks():
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode()
+                    digest.update(chunk)
+                    output.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = posixpath.join(
+                posixpath.dirname(name.replace("\\", "/")),
+                hexdigest[:2], hexdigest[2:4],
+                hexdigest + os.path.splitext(name)[1].lower()
+            )
+            full_path = self.path(name)
+            try:
+                os.utime(full_path)
+            except FileNotFoundError:
+                pass
+            else:
+                os.remove(temporary)
+                return name
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(temporary, self.file_permissions_mode)
+            # Identical concurrent uploads just replace the same bytes.
+            os.replace(temporary, full_path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        return name
@@ -0,0 +1,62 @@
+import copy
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+@contextmanager
+def temporary_cache():
+    """Point the default cache at a new file, removed on exit.
+
+    Tests clear the cache freely; the file of a running dev server must
+    not be the one they clear. Worker processes forked meanwhile inherit
+    the setting.
+    """
+    directory = tempfile.mkdtemp(prefix="yatube-test-cache-")
+    caches = copy.deepcopy(settings.CACHES)
+    caches["default"]["LOCATION"] = os.path.join(directory, "cache.sqlite3")
+    try:
+        with override_settings(CACHES=caches):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+@contextmanager
+def inline_commit_callbacks():
+    """Run on_commit callbacks at once and background work inline.
+
+    TestCase rolls every test back, so callbacks would never run; and the
+    in-memory test database raises "table is locked" when written from
+    the timeline and thumbnail worker threads.
+    """
+    with mock.patch("django.db.transaction.on_commit",
+                    lambda func, using=None: func()), \
+            override_settings(TIMELINE_FANOUT_ASYNC=False,
+                              THUMBNAIL_PREGENERATE_ASYNC=False):
+        yield
+
+
+@contextmanager
+def test_environment():
+    with temporary_cache(), inline_commit_callbacks():
+        yield
+
+
+class TestRunner(DiscoverRunner):
+    """DiscoverRunner that runs the suite in test_environment."""
+
+    def setup_test_environment(self, **kwargs):
+        self.resources = ExitStack()
+        self.resources.enter_context(test_environment())
+        super().setup_test_environment(**kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        self.resources.close()
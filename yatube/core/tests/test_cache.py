@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.test import SimpleTestCase
+
+from core.cache import SQLiteCache
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "cache.sqlite3")
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {"OPTIONS": options})
+
+    def test_values_roundtrip(self):
+        """Тестирование записи и чтения значений"""
+        values = {"int": 5, "str": "строка", "bool": True,
+                  "dict": {"a": [1, 2]}, "bytes": b"\x00\x01"}
+        self.cache.set_many(values)
+        self.assertEqual(self.cache.get_many(list(values)), values)
+        self.cache.delete("int")
+        self.assertIsNone(self.cache.get("int"))
+        self.assertEqual(self.cache.get("int", "default"), "default")
+
+    def test_cache_is_shared_between_instances(self):
+        """Тестирование общего кэша для разных процессов"""
+        self.cache.set("key", "value")
+        self.assertEqual(self.make_cache().get("key"), "value")
+
+    def test_timeouts(self):
+        """Тестирование времени жизни записей"""
+        self.cache.set("short", 1, 0.05)
+        self.cache.set("forever", 1, None)
+        self.assertTrue(self.cache.has_key("short"))
+        time.sleep(0.1)
+        self.assertFalse(self.cache.has_key("short"))
+        self.assertTrue(self.cache.add("short", 2))
+        self.assertFalse(self.cache.add("forever", 2))
+        self.assertEqual(self.cache.get("forever"), 1)
+        self.assertTrue(self.cache.touch("forever", 0.05))
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get("forever"))
+
+    def test_incr_is_atomic(self):
+        """Тестирование атомарности incr"""
+        self.cache.set("counter", 0)
+
+        def work():
+            cache = self.make_cache()
+            for _ in range(50):
+                cache.incr("counter")
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get("counter"), 200)
+        self.assertEqual(self.cache.decr("counter", 10), 190)
+        self.cache.set("text", "value")
+        with self.assertRaises(ValueError):
+            self.cache.incr("text")
+        with self.assertRaises(ValueError):
+            self.cache.incr("missing")
+
+    def test_lru_eviction(self):
+        """Тестирование вытеснения давно неиспользуемых записей"""
+        cache = self.make_cache(MAX_ENTRIES=10, CULL_FREQUENCY=5,
+                                CULL_EVERY=1, LRU_RESOLUTION=0)
+        cache.set("hot", "value")
+        for i in range(20):
+            cache.set(f"cold:{i}", i)
+            cache.get("hot")
+        self.assertEqual(cache.get("hot"), "value")
+        self.assertIsNone(cache.get("cold:0"))
+        count, = cache._db.execute("SELECT COUNT(*) FROM cache").fetchone()
+        self.assertLessEqual(count, 10)
+
+    def test_set_many_counts_towards_culling(self):
+        """Тестирование ограничения размера при записи пачками"""
+        cache = self.make_cache(MAX_ENTRIES=10, CULL_FREQUENCY=5,
+                                CULL_EVERY=5)
+        for batch in range(10):
+            cache.set_many({f"key:{batch}:{i}": i for i in range(3)})
+        count, = cache._db.execute("SELECT COUNT(*) FROM cache").fetchone()
+        self.assertLessEqual(count, 10)
+
+    def test_clear(self):
+        """Тестирование очистки кэша"""
+        self.cache.set("key", "value")
+        self.cache.clear()
+        self.assertIsNone(self.cache.get("key"))
+
+    def test_tests_do_not_share_the_dev_cache(self):
+        """Тестирование отдельного файла кэша для тестов"""
+        location = settings.CACHES["default"]["LOCATION"]
+        self.assertNotEqual(location,
+                            os.path.join(settings.BASE_DIR, "cache.sqlite3"))
+        self.assertTrue(location.startswith(tempfile.gettempdir()))
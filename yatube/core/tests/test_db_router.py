@@ -0,0 +1,94 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.db_router import PIN_COOKIE
+from posts.models import AuthorStats, Post
+
+User = get_user_model()
+
+
+@override_settings(DATABASE_REPLICAS=["replica"])
+class ReplicaRouterTest(TestCase):
+    databases = {"default", "replica"}
+
+    @classmethod
+    def setUpClass(cls):
+        # The replica is a copy of the test database file that never
+        # receives the writes made afterwards, like a lagging replica.
+        cls.directory = tempfile.mkdtemp()
+        path = os.path.join(cls.directory, "replica.sqlite3")
+        connections["default"].ensure_connection()
+        replica = sqlite3.connect(path)
+        connections["default"].connection.backup(replica)
+        replica.close()
+        connections.databases["replica"] = {
+            **connections.databases["default"], "NAME": path
+        }
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        User.objects.using("replica").bulk_create([cls.author, cls.reader])
+        Post.objects.using("replica").bulk_create([
+            Post(text="replica post", author_id=cls.author.pk)
+        ])
+        Post.objects.create(text="primary post", author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections["replica"].close()
+        del connections.databases["replica"]
+        delattr(connections._connections, "replica")
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_get_views_read_from_replica(self):
+        """Тестирование чтения страниц с реплики"""
+        response = self.reader_client.get(reverse("index"))
+        self.assertContains(response, "replica post")
+        self.assertNotContains(response, "primary post")
+        # Sessions are only read from the primary.
+        self.assertEqual(response.context["user"], self.reader)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_client_reads_own_writes(self):
+        """Тестирование чтения своих записей после изменения"""
+        response = self.reader_client.post(reverse("new_post"),
+                                           {"text": "new post"})
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertFalse(Post.objects.using("replica").filter(
+            text="new post"
+        ).exists())
+        response = self.reader_client.get(reverse("index"))
+        self.assertContains(response, "new post")
+        self.assertContains(response, "primary post")
+        response = self.guest_client.get(reverse("index"))
+        self.assertNotContains(response, "new post")
+        # Possibly stale pages are neither cached nor validated.
+        self.assertNotIn("ETag", response)
+
+    def test_missing_stats_are_counted_on_primary(self):
+        """Тестирование подсчёта отсутствующих счётчиков на мастере"""
+        for _ in range(2):
+            Post.objects.create(text="primary post", author=self.author)
+        AuthorStats.objects.filter(user=self.author).delete()
+        response = self.reader_client.get(
+            reverse("profile", kwargs={"username": self.author.username})
+        )
+        self.assertContains(response, "replica post")
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).posts_count, 3
+        )
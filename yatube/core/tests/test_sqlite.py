@@ -0,0 +1,59 @@
+from unittest import mock
+
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.sqlite import write_transaction
+
+
+@override_settings(SQLITE_WRITE_RETRIES=2, SQLITE_WRITE_BACKOFF=0)
+class WriteTransactionTest(TestCase):
+    def test_connection_pragmas(self):
+        """Тестирование настройки соединения с SQLite"""
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+
+    def test_retries_locked_database(self):
+        """Тестирование повтора транзакции при блокировке базы"""
+        func = mock.Mock(side_effect=[
+            OperationalError("database is locked"), "done"
+        ])
+        self.assertEqual(write_transaction(func, 1), "done")
+        self.assertEqual(func.call_count, 2)
+        func.assert_called_with(1)
+
+    def test_gives_up_after_retries(self):
+        """Тестирование отказа после исчерпания повторов"""
+        func = mock.Mock(side_effect=OperationalError("database is locked"))
+        with self.assertRaises(OperationalError):
+            write_transaction(func)
+        self.assertEqual(func.call_count, 3)
+
+    def test_other_errors_are_not_retried(self):
+        """Тестирование ошибок, не связанных с блокировкой"""
+        func = mock.Mock(side_effect=OperationalError("no such table"))
+        with self.assertRaises(OperationalError):
+            write_transaction(func)
+        self.assertEqual(func.call_count, 1)
+
+    @override_settings(SQLITE_WRITE_GATE=False)
+    def test_gate_off(self):
+        """Тестирование работы без шлюза записи"""
+        func = mock.Mock(side_effect=OperationalError("database is locked"))
+        with self.assertRaises(OperationalError):
+            write_transaction(func)
+        self.assertEqual(func.call_count, 1)
+
+
+class ImmediateTransactionTest(TransactionTestCase):
+    def test_write_transaction_takes_lock_up_front(self):
+        """Тестирование захвата блокировки в начале транзакции записи"""
+        with CaptureQueriesContext(connection) as context:
+            write_transaction(lambda: None)
+            with transaction.atomic():
+                pass
+        begins = [query["sql"] for query in context.captured_queries
+                  if query["sql"].startswith("BEGIN")]
+        self.assertEqual(begins, ["BEGIN IMMEDIATE", "BEGIN"])
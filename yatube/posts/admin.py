@@ -1,23 +1,201 @@
+from django import forms
+from django.conf import settings
 from django.contrib import admin
+from django.contrib.admin import helpers
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import F
+from django.template.response import TemplateResponse
+from django.utils.functional import cached_property
 
+from . import cards, page_cache, search
 from .models import Comment, Follow, Group, Post
 
 
-class PostAdmin(admin.ModelAdmin):
+def approximate_count(queryset):
+    """Row count of ``queryset`` that never scans a big table.
+
+    Up to ADMIN_COUNT_LIMIT rows are counted exactly. Past that an
+    unfiltered table is estimated from its largest primary key, which is
+    a single index seek, and a filtered one is reported as the limit.
+    """
+    limit = settings.ADMIN_COUNT_LIMIT
+    count = queryset.order_by().values("pk")[:limit + 1].count()
+    if count <= limit:
+        return count
+    if not queryset.query.where:
+        return queryset.order_by("-pk").values_list("pk", flat=True)[0]
+    return limit
+
+
+def chunked(queryset, size=None):
+    """Yield the primary keys of ``queryset`` in lists of ``size``.
+
+    Chunks are read by keyset on the primary key, so neither the ids nor
+    the instances of the whole selection are ever held in memory.
+    """
+    size = size or settings.ADMIN_ACTION_CHUNK_SIZE
+    pks = queryset.order_by("pk").values_list("pk", flat=True)
+    last = None
+    while True:
+        chunk = pks if last is None else pks.filter(pk__gt=last)
+        chunk = list(chunk[:size])
+        if not chunk:
+            return
+        yield chunk
+        last = chunk[-1]
+
+
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        return approximate_count(self.object_list)
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist for tables of tens of millions of rows.
+
+    Authors are joined into the page query, counts are estimated, and
+    ``@name`` searches by the exact author username through its unique
+    index instead of running ``search_fields``. The stock delete action,
+    which collects every selected object up front, is replaced by
+    ``delete_in_chunks``.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_select_related = ("author",)
+    actions = ("delete_in_chunks",)
+    empty_value_display = "-пусто-"
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop("delete_selected", None)
+        return actions
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if term.startswith("@"):
+            return queryset.filter(author__username=term[1:]), False
+        return super().get_search_results(request, queryset, search_term)
+
+    def confirm_action(self, request, queryset, action, title, form=None):
+        """Ask before running ``action`` on the selection, or return None
+        once the confirmation form was submitted and is valid."""
+        if request.POST.get("apply") and (form is None or form.is_valid()):
+            return None
+        select_across = request.POST.get("select_across") == "1"
+        context = {
+            **self.admin_site.each_context(request),
+            "title": title,
+            "opts": self.model._meta,
+            "action": action,
+            "form": form,
+            "count": approximate_count(queryset),
+            "select_across": select_across,
+            "selected": request.POST.getlist(helpers.ACTION_CHECKBOX_NAME),
+            "action_checkbox_name": helpers.ACTION_CHECKBOX_NAME,
+        }
+        return TemplateResponse(request, "admin/posts/chunked_action.html",
+                                context)
+
+    def delete_in_chunks(self, request, queryset):
+        response = self.confirm_action(request, queryset, "delete_in_chunks",
+                                       "Удалить выбранные записи?")
+        if response is not None:
+            return response
+        deleted = 0
+        for chunk in chunked(queryset):
+            # Each chunk is loaded and deleted on its own, so signal
+            # handlers still see every instance.
+            with transaction.atomic():
+                deleted += self.delete_chunk(chunk)
+        self.message_user(request, f"Удалено записей: {deleted}")
+        return None
+
+    delete_in_chunks.short_description = "Удалить выбранные записи порциями"
+    delete_in_chunks.allowed_permissions = ("delete",)
+
+    def delete_chunk(self, pks):
+        """Delete the objects with primary keys ``pks``, return how many."""
+        return self.model.objects.filter(pk__in=pks).delete()[1].get(
+            self.model._meta.label, 0
+        )
+
+
+class MoveToGroupForm(forms.Form):
+    group = forms.ModelChoiceField(Group.objects.all(), required=False,
+                                   empty_label="-пусто-", label="Группа")
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = ("pk", "text", "pub_date", "author")
     search_fields = ("text",)
+    # The date filter offers fixed ranges and runs no query of its own.
     list_filter = ("pub_date",)
-    empty_value_display = "-пусто-"
+    date_hierarchy = "pub_date"
+    actions = ("move_to_group", "delete_in_chunks")
+
+    def get_search_results(self, request, queryset, search_term):
+        if search_term.strip().startswith("@"):
+            return super().get_search_results(request, queryset,
+                                              search_term)
+        match = search.match_expression(search_term)
+        if match is None:
+            return queryset, False
+        return queryset.filter(pk__in=search.matching_ids(match)), False
 
+    def move_to_group(self, request, queryset):
+        form = MoveToGroupForm(request.POST if "apply" in request.POST
+                               else None)
+        response = self.confirm_action(request, queryset, "move_to_group",
+                                       "Перенести выбранные посты в группу",
+                                       form)
+        if response is not None:
+            return response
+        group = form.cleaned_data["group"]
+        moved = 0
+        for chunk in chunked(queryset):
+            scopes = page_cache.post_scopes(pk__in=chunk)
+            with transaction.atomic():
+                moved += Post.objects.filter(pk__in=chunk).update(
+                    group=group, version=F("version") + 1
+                )
+            page_cache.invalidate(*scopes)
+        if group is not None:
+            page_cache.invalidate(f"group:{group.slug}")
+        self.message_user(request, f"Перенесено постов: {moved}")
+        return None
 
-class CommentAdmin(admin.ModelAdmin):
+    move_to_group.short_description = "Перенести выбранные посты в группу"
+    move_to_group.allowed_permissions = ("change",)
+
+
+class CommentAdmin(LargeTableAdmin):
     list_display = ("pk", "text", "created", "author")
-    search_fields = ("text", "author")
-    empty_value_display = "-пусто-"
+    search_fields = ("text",)
+
+    # Deleted comments send no signal (see posts.signals), so the cards
+    # and pages of their posts are invalidated here.
+    def forget_comments(self, post_ids):
+        cards.bump_versions(pk__in=post_ids)
+        page_cache.invalidate_posts(pk__in=post_ids)
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        self.forget_comments([obj.post_id])
+
+    def delete_chunk(self, pks):
+        post_ids = set(Comment.objects.filter(pk__in=pks).values_list(
+            "post_id", flat=True
+        ))
+        deleted = super().delete_chunk(pks)
+        self.forget_comments(post_ids)
+        return deleted
 
 
 class FollowAdmin(admin.ModelAdmin):
     list_display = ("pk", "user", "author")
+    list_select_related = ("user", "author")
 
 
 class GroupAdmin(admin.ModelAdmin):
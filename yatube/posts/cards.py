@@ -0,0 +1,95 @@
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+
+from .models import Post
+
+CARD_KEY = "post_card:{}:{}:{}:{}"
+STATS_KEY = "post_card_stats:{}"
+
+# Hits and misses of this process not yet added to the shared counters.
+# Counting every card in the cache would make each page render a series
+# of writes that all workers contend for.
+_pending = Counter()
+_pending_lock = threading.Lock()
+_last_flush = time.monotonic()
+
+
+def card_cache_key(post, is_author, comment_button):
+    return CARD_KEY.format(post.pk, post.version, int(is_author),
+                           int(comment_button))
+
+
+def bump_versions(**filters):
+    """Invalidate the cached cards of every post matching ``filters``."""
+    Post.objects.filter(**filters).update(version=F("version") + 1)
+
+
+def _add(outcome, count):
+    key = STATS_KEY.format(outcome)
+    try:
+        cache.incr(key, count)
+    except ValueError:
+        if not cache.add(key, count, None):
+            cache.incr(key, count)
+
+
+def flush_card_stats():
+    """Add this process's pending hits and misses to the shared counters."""
+    global _last_flush
+    with _pending_lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+    for outcome, count in pending.items():
+        if count:
+            _add(outcome, count)
+
+
+def record(hits, misses):
+    with _pending_lock:
+        _pending["hit"] += hits
+        _pending["miss"] += misses
+        due = (time.monotonic() - _last_flush
+               >= settings.POST_CARD_STATS_FLUSH_INTERVAL)
+    if due:
+        flush_card_stats()
+
+
+def card_cache_stats():
+    flush_card_stats()
+    counts = cache.get_many([STATS_KEY.format("hit"),
+                             STATS_KEY.format("miss")])
+    hits = counts.get(STATS_KEY.format("hit"), 0)
+    misses = counts.get(STATS_KEY.format("miss"), 0)
+    total = hits + misses
+    return {"hits": hits, "misses": misses,
+            "ratio": hits / total if total else 0.0}
+
+
+def reset_card_cache_stats():
+    with _pending_lock:
+        _pending.clear()
+    cache.delete_many([STATS_KEY.format("hit"), STATS_KEY.format("miss")])
+
+
+def get_or_render(posts, viewer_id, comment_button, render):
+    """HTML of the cards of ``posts``, from one cache read.
+
+    Missing cards are rendered with ``render(post)`` and stored together.
+    """
+    keys = [card_cache_key(post, post.author_id == viewer_id,
+                           comment_button) for post in posts]
+    cards = cache.get_many(keys)
+    missing = {}
+    for key, post in zip(keys, posts):
+        if key not in cards:
+            cards[key] = missing[key] = render(post)
+    record(len(keys) - len(missing), len(missing))
+    if missing:
+        cache.set_many(missing, settings.POST_CARD_CACHE_TIMEOUT)
+    return [cards[key] for key in keys]
@@ -0,0 +1,24 @@
+from django.conf import settings
+
+from .models import Post
+from .pagination import paginate
+from .recent_posts import pull_page
+from .timeline import timeline_page
+
+
+def join_page(request):
+    post_list = Post.objects.for_feed().filter(
+        author__following__user=request.user
+    )
+    return paginate(request, post_list)
+
+
+FOLLOW_FEED_ENGINES = {
+    "join": join_page,
+    "timeline": timeline_page,
+    "pull": pull_page,
+}
+
+
+def follow_feed_page(request, engine=None):
+    return FOLLOW_FEED_ENGINES[engine or settings.FOLLOW_FEED_ENGINE](request)
@@ -0,0 +1,84 @@
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from posts.feeds import FOLLOW_FEED_ENGINES, follow_feed_page
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Compare follow feed engines on the current database."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user",
+                            help="Reader username; defaults to the user "
+                                 "following the most authors.")
+        parser.add_argument("--engines", nargs="+",
+                            default=list(FOLLOW_FEED_ENGINES),
+                            choices=list(FOLLOW_FEED_ENGINES))
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--pages", type=int, default=3,
+                            help="Pages walked per iteration via cursors.")
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"User {username} does not exist.")
+        user = User.objects.annotate(
+            follows=Count("follower")
+        ).order_by("-follows").first()
+        if user is None:
+            raise CommandError("There are no users to benchmark.")
+        return user
+
+    def walk(self, engine, user, pages):
+        factory = RequestFactory()
+        params, ids = {}, []
+        for _ in range(pages):
+            request = factory.get("/follow/", params)
+            request.user = user
+            page = follow_feed_page(request, engine)
+            ids.extend(post.id for post in page.object_list)
+            if not page.next_cursor:
+                break
+            params = {"after": page.next_cursor}
+        return ids
+
+    def handle(self, *args, **options):
+        user = self.get_user(options["user"])
+        self.stdout.write(
+            f"Reader {user.username}: follows "
+            f"{user.follower.count()} authors, "
+            f"{options['iterations']} iterations x {options['pages']} pages"
+        )
+        reference = None
+        for engine in options["engines"]:
+            ids = self.walk(engine, user, options["pages"])
+            if reference is None:
+                reference = ids
+            elif ids != reference:
+                self.stderr.write(f"{engine}: results differ from "
+                                  f"{options['engines'][0]}")
+            with CaptureQueriesContext(connection) as queries:
+                self.walk(engine, user, options["pages"])
+            timings = []
+            for _ in range(options["iterations"]):
+                started = time.perf_counter()
+                self.walk(engine, user, options["pages"])
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            self.stdout.write(
+                f"{engine:>10}: mean {statistics.mean(timings):8.2f} ms  "
+                f"p95 {p95:8.2f} ms  "
+                f"queries {len(queries.captured_queries)}"
+            )
@@ -0,0 +1,90 @@
+import os
+import random
+import time
+from io import BytesIO
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image, ImageDraw, ImageFilter, ImageOps
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.parsers import parse_geometry
+
+from posts import thumbnails
+
+FORMATS = ("JPEG", "WEBP", "AVIF")
+
+
+def sample_image(rng, size=(1600, 1200)):
+    """A photo-like picture: soft shapes over a gradient, plus noise."""
+    image = Image.linear_gradient("L").resize(size).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for _ in range(40):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        radius = rng.randrange(20, 300)
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius),
+                     fill=tuple(rng.randrange(256) for _ in range(3)))
+    image = image.filter(ImageFilter.GaussianBlur(8))
+    noise = Image.effect_noise(size, 24).convert("RGB")
+    return Image.blend(image, noise, 0.15)
+
+
+class Command(BaseCommand):
+    help = ("Measure encode throughput and size of post image renditions "
+            "per format on a sample corpus.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--directory",
+                            help="Sample images; a synthetic corpus is "
+                                 "generated if omitted.")
+        parser.add_argument("--count", type=int, default=20,
+                            help="Size of the synthetic corpus.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def corpus(self, options):
+        if options["directory"] is None:
+            rng = random.Random(options["seed"])
+            return [sample_image(rng) for _ in range(options["count"])]
+        images = []
+        for name in sorted(os.listdir(options["directory"])):
+            try:
+                with Image.open(os.path.join(options["directory"],
+                                             name)) as image:
+                    images.append(image.convert("RGB"))
+            except OSError:
+                continue
+        if not images:
+            raise CommandError("No readable images in the directory.")
+        return images
+
+    def handle(self, *args, **options):
+        images = self.corpus(options)
+        sizes = [parse_geometry(geometry)
+                 for key, (geometry, _) in thumbnails.renditions().items()
+                 if key not in settings.THUMBNAIL_GEOMETRIES]
+        Image.init()
+        formats = [name for name in FORMATS if name in Image.SAVE]
+        self.stdout.write(
+            f"{len(images)} images x {len(sizes)} sizes, quality "
+            f"{sorl_settings.THUMBNAIL_QUALITY}; formats: "
+            f"{', '.join(formats)}"
+        )
+        # Resizing is shared by all formats, so only encoding is timed.
+        resized = [ImageOps.fit(image, size, Image.LANCZOS)
+                   for image in images for size in sizes]
+        pixels = sum(image.width * image.height for image in resized)
+        baseline = None
+        for name in formats:
+            total, started = 0, time.perf_counter()
+            for image in resized:
+                output = BytesIO()
+                image.save(output, name,
+                           quality=sorl_settings.THUMBNAIL_QUALITY)
+                total += output.tell()
+            elapsed = time.perf_counter() - started
+            baseline = baseline or total
+            self.stdout.write(
+                f"{name:>5}: {len(resized) / elapsed:8.1f} images/s  "
+                f"{pixels / elapsed / 10 ** 6:7.1f} MP/s  "
+                f"{total / 1024:10.1f} KiB  "
+                f"{(1 - total / baseline) * 100:+6.1f}% saved vs JPEG"
+            )
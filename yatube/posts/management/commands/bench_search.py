@@ -0,0 +1,72 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import search
+from posts.management.commands.bench_views import percentile
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ("Compare full-text search latency with a LIKE scan on the "
+            "current database, e.g. after seed_bench --posts 1000000.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--queries", type=int, default=100)
+        parser.add_argument("--like", action="store_true",
+                            help="Also time the LIKE '%%term%%' scan.")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def sample_queries(self, count, rng):
+        last = Post.objects.order_by("-id").values_list("id", flat=True)
+        last = last.first()
+        if last is None:
+            raise CommandError("Nothing to search, run seed_bench first.")
+        queries = []
+        while len(queries) < count:
+            text = Post.objects.filter(
+                id__gte=rng.randint(1, last)
+            ).order_by("id").values_list("text", flat=True).first()
+            words = (text or "").split()
+            if words:
+                queries.append(" ".join(
+                    rng.sample(words, min(len(words), rng.choice((1, 2))))
+                ))
+        return queries
+
+    def fts(self, query):
+        match = search.match_expression(query)
+        rows = search.ranked(match)
+        search.snippets(match, [post_id for _, post_id in rows])
+        return len(rows)
+
+    def like(self, query):
+        posts = Post.objects.all()
+        for word in query.split():
+            posts = posts.filter(text__icontains=word)
+        posts = posts.order_by("-pub_date", "-id")
+        return len(posts[:search.POSTS_PER_PAGE])
+
+    def run(self, name, engine, queries):
+        timings = []
+        for query in queries:
+            started = time.perf_counter()
+            engine(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        self.stdout.write(
+            f"{name:>5}: p50 {percentile(timings, 0.50):8.2f} ms  "
+            f"p95 {percentile(timings, 0.95):8.2f} ms  "
+            f"p99 {percentile(timings, 0.99):8.2f} ms"
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        queries = self.sample_queries(options["queries"], rng)
+        self.stdout.write(
+            f"{Post.objects.count()} posts, {len(queries)} queries"
+        )
+        self.run("fts", self.fts, queries)
+        if options["like"]:
+            self.run("like", self.like, queries)
@@ -0,0 +1,130 @@
+import json
+import math
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+METRICS = ("p50", "p95", "p99", "queries")
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(math.ceil(fraction * len(values)), 1)
+    return values[rank - 1]
+
+
+class Command(BaseCommand):
+    help = ("Measure latency percentiles and query counts of the main views "
+            "on the current database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=50,
+                            help="Measured requests per URL.")
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument("--cold", action="store_true",
+                            help="Clear the cache before every request.")
+        parser.add_argument("--output", help="Write JSON results here.")
+        parser.add_argument("--baseline",
+                            help="Compare with results saved by --output.")
+        parser.add_argument("--max-regression", type=float,
+                            help="Fail if any p95 grows by more than this "
+                                 "many percent over the baseline.")
+
+    def targets(self):
+        """Pick the heaviest instance of each page: it is the one to watch."""
+        post = Post.objects.annotate(
+            comments_total=Count("comments")
+        ).order_by("-comments_total").select_related("author").first()
+        group = Group.objects.annotate(
+            posts_total=Count("posts")
+        ).order_by("-posts_total").first()
+        author = User.objects.order_by("-stats__posts_count").first()
+        reader = User.objects.order_by("-stats__following_count").first()
+        if post is None or group is None:
+            raise CommandError("Nothing to benchmark, run seed_bench first.")
+        return reader, {
+            "index": reverse("index"),
+            "group": reverse("group", kwargs={"slug": group.slug}),
+            "profile": reverse("profile",
+                               kwargs={"username": author.username}),
+            "post": reverse("post", kwargs={"username": post.author.username,
+                                            "post_id": post.id}),
+            "follow_index": reverse("follow_index"),
+        }
+
+    def measure(self, client, url, options):
+        for _ in range(options["warmup"]):
+            client.get(url)
+        timings, queries = [], []
+        for _ in range(options["requests"]):
+            if options["cold"]:
+                cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f"{url} returned {response.status_code}")
+            queries.append(len(context.captured_queries))
+        timings.sort()
+        return {
+            "url": url,
+            "requests": len(timings),
+            "mean": statistics.mean(timings),
+            "p50": percentile(timings, 0.50),
+            "p95": percentile(timings, 0.95),
+            "p99": percentile(timings, 0.99),
+            "queries": statistics.median(queries),
+        }
+
+    def compare(self, results, baseline, max_regression):
+        regressions = []
+        for name, result in results.items():
+            before = baseline.get(name)
+            if before is None:
+                continue
+            changes = []
+            for metric in METRICS:
+                old, new = before[metric], result[metric]
+                change = (new - old) / old * 100 if old else 0.0
+                changes.append(f"{metric} {change:+6.1f}%")
+                if (metric == "p95" and max_regression is not None
+                        and change > max_regression):
+                    regressions.append(f"{name} p95 {change:+.1f}%")
+            self.stdout.write(f"{name:<14} vs baseline: " + "  ".join(changes))
+        if regressions:
+            raise CommandError("Regressions: " + ", ".join(regressions))
+
+    def handle(self, *args, **options):
+        reader, urls = self.targets()
+        client = Client()
+        client.force_login(reader)
+        results = {}
+        for name, url in urls.items():
+            results[name] = result = self.measure(client, url, options)
+            self.stdout.write(
+                f"{name:<14} p50 {result['p50']:8.2f} ms  "
+                f"p95 {result['p95']:8.2f} ms  "
+                f"p99 {result['p99']:8.2f} ms  "
+                f"queries {result['queries']:g}"
+            )
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump({"cold": options["cold"], "results": results},
+                          output, indent=2)
+        if options["baseline"]:
+            with open(options["baseline"]) as baseline:
+                self.compare(results, json.load(baseline)["results"],
+                             options["max_regression"])
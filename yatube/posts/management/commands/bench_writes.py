@@ -0,0 +1,135 @@
+import multiprocessing
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from posts.management.commands.bench_views import percentile
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+MARKER = "bench_writes"
+
+# Stock Django: rollback journal, full fsync, no mmap, deferred
+# transactions and the driver's default 5 s busy timeout.
+MODES = {
+    "baseline": {
+        "SQLITE_PRAGMAS": {"journal_mode": "DELETE", "synchronous": "FULL",
+                           "mmap_size": 0},
+        "SQLITE_WRITE_GATE": False,
+    },
+    "tuned": {},
+}
+
+
+def work(client, urls, requests, results):
+    """Alternate comments, posts and page reads; report each write."""
+    latencies, errors = [], Counter()
+    for number in range(requests):
+        if number % 5 == 4:
+            url, data = urls["new_post"], {"text": f"{MARKER} {number}"}
+        else:
+            url, data = urls["add_comment"], {"text": f"{MARKER} {number}"}
+        started = time.perf_counter()
+        try:
+            response = client.post(url, data)
+            if response.status_code != 302:
+                errors[f"HTTP {response.status_code}"] += 1
+                continue
+        except Exception as error:
+            errors[f"{type(error).__name__}: {error}"] += 1
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+        client.get(urls["post"])
+    results.put((latencies, errors))
+
+
+class Command(BaseCommand):
+    help = ("Hammer the current SQLite database with comments and posts "
+            "from several processes at once, with stock SQLite settings and "
+            "with SQLITE_PRAGMAS and the write gate, and compare write "
+            "throughput and error rates. Written rows are deleted "
+            "afterwards.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--requests", type=int, default=100,
+                            help="Writes per worker.")
+        parser.add_argument("--modes", nargs="+", default=list(MODES),
+                            choices=list(MODES))
+
+    def targets(self, count):
+        post = Post.objects.select_related("author").order_by("-pk").first()
+        users = list(User.objects.order_by("pk")[:count])
+        if post is None or len(users) < count:
+            raise CommandError(f"Need a post and {count} users, run "
+                               f"seed_bench first.")
+        return users, {
+            "new_post": reverse("new_post"),
+            "add_comment": reverse("add_comment",
+                                   args=(post.author.username, post.pk)),
+            "post": reverse("post", args=(post.author.username, post.pk)),
+        }
+
+    def run(self, clients, urls, requests):
+        # Forked children must open their own connections.
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        results = context.Queue()
+        workers = [
+            context.Process(target=work,
+                            args=(client, urls, requests, results))
+            for client in clients
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        reports = [results.get() for _ in workers]
+        elapsed = time.perf_counter() - started
+        for worker in workers:
+            worker.join()
+        latencies = sorted(latency for report, _ in reports
+                           for latency in report)
+        errors = sum((errors for _, errors in reports), Counter())
+        return elapsed, latencies, errors
+
+    def report(self, mode, elapsed, latencies, errors):
+        total = len(latencies) + sum(errors.values())
+        p95 = percentile(latencies, 0.95) if latencies else 0.0
+        self.stdout.write(
+            f"{mode:<9} {len(latencies) / elapsed:8.1f} writes/s  "
+            f"errors {sum(errors.values()) / total:6.1%}  "
+            f"p95 {p95:8.1f} ms"
+        )
+        for message, count in errors.most_common():
+            self.stdout.write(f"{'':<9} {count:>5} x {message}")
+
+    def handle(self, *args, **options):
+        users, urls = self.targets(options["workers"])
+        clients = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+        try:
+            for mode in options["modes"]:
+                # Worker processes exit without waiting for background
+                # threads, so timelines are written inside the request.
+                with override_settings(TIMELINE_FANOUT_ASYNC=False,
+                                       **MODES[mode]):
+                    # Switch the journal mode before the workers start.
+                    connections.close_all()
+                    connection.ensure_connection()
+                    self.report(mode, *self.run(clients, urls,
+                                                options["requests"]))
+        finally:
+            connections.close_all()
+            connection.ensure_connection()
+            Comment.objects.filter(text__startswith=MARKER).delete()
+            Post.objects.filter(text__startswith=MARKER).delete()
@@ -0,0 +1,113 @@
+import gzip
+import sys
+import time
+from contextlib import contextmanager
+
+from django.core.management.base import BaseCommand
+
+from posts.models import Comment, Follow, Group, Post
+from posts.pagination import CursorEncoder
+
+# Record types in the order they are written and must be imported.
+# Users are referred to by username and groups by slug; posts and comments
+# keep their ids, so comments can point at their post across instances.
+RECORDS = {
+    "group": ("slug", "title", "description"),
+    "post": ("id", "text", "pub_date", "author", "group", "image",
+             "image_hash"),
+    "comment": ("id", "post", "author", "text", "created"),
+    "follow": ("user", "author"),
+}
+
+
+@contextmanager
+def open_stream(path, mode, compress=False):
+    """Text stream over ``path``, or stdin/stdout for "-".
+
+    The stream is gzip-compressed when asked to or when the file name
+    ends with ".gz".
+    """
+    compress = compress or path.endswith(".gz")
+    if path == "-":
+        raw = sys.stdout.buffer if "w" in mode else sys.stdin.buffer
+        stream = (gzip.open(raw, mode, encoding="utf-8") if compress
+                  else open(raw.fileno(), mode, encoding="utf-8",
+                            closefd=False))
+    elif compress:
+        stream = gzip.open(path, mode, encoding="utf-8")
+    else:
+        stream = open(path, mode, encoding="utf-8")
+    try:
+        yield stream
+    finally:
+        stream.close()
+
+
+class Progress:
+    """Rows per record type and their throughput."""
+
+    def __init__(self, output):
+        self.output = output
+        self.started = time.perf_counter()
+        self.counts = {}
+        self.skipped = {}
+
+    def add(self, kind, count=1, skipped=0):
+        self.counts[kind] = self.counts.get(kind, 0) + count
+        self.skipped[kind] = self.skipped.get(kind, 0) + skipped
+
+    def report(self, verb):
+        elapsed = max(time.perf_counter() - self.started, 1e-9)
+        total = sum(self.counts.values())
+        for kind, count in self.counts.items():
+            skipped = self.skipped[kind]
+            self.output.write(f"{kind:>8}: {count} rows"
+                              + (f", {skipped} skipped" if skipped else ""))
+        self.output.write(
+            f"{verb} {total} rows in {elapsed:.1f} s, "
+            f"{total / elapsed:.0f} rows/s"
+        )
+
+
+class Command(BaseCommand):
+    help = ("Stream groups, posts, comments and follows as NDJSON, one "
+            "record per line. Image files are referenced by name; copy "
+            "MEDIA_ROOT alongside the export.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-",
+                            help="Output file, stdout by default.")
+        parser.add_argument("--gzip", action="store_true",
+                            help="Compress even without a .gz suffix.")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def rows(self, chunk_size):
+        querysets = {
+            "group": Group.objects.values_list(*RECORDS["group"]),
+            "post": Post.objects.values_list(
+                "id", "text", "pub_date", "author__username", "group__slug",
+                "image", "image_hash"
+            ),
+            "comment": Comment.objects.values_list(
+                "id", "post_id", "author__username", "text", "created"
+            ),
+            "follow": Follow.objects.values_list("user__username",
+                                                 "author__username"),
+        }
+        for kind, queryset in querysets.items():
+            for row in queryset.order_by("pk").iterator(
+                    chunk_size=chunk_size):
+                yield kind, row
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        # Keep stdout clean for the data itself.
+        progress = Progress(self.stderr if path == "-" else self.stdout)
+        encoder = CursorEncoder(ensure_ascii=False)
+        with open_stream(path, "wt", options["gzip"]) as stream:
+            for kind, row in self.rows(options["chunk_size"]):
+                record = {"model": kind, **dict(zip(RECORDS[kind], row))}
+                stream.write(encoder.encode(record))
+                stream.write("\n")
+                progress.add(kind)
+        progress.report("Exported")
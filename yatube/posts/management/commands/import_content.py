@@ -0,0 +1,298 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+
+from posts.management.commands.export_content import (RECORDS, Progress,
+                                                      open_stream)
+from core.sqlite import write_transaction
+from posts import stats, timeline
+from posts.management.commands.seed_bench import explicit_dates
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Stay under SQLite's limit of 999 variables per query.
+LOOKUP_CHUNK = 500
+
+# Source ids of imported posts and the ids they were stored under, kept
+# in the database for the comments that come later in the stream.
+POST_IDS_TABLE = "import_post_ids"
+
+
+def lookup(queryset, field, values):
+    """Map each of ``values`` found in ``field`` to the row's pk."""
+    values = list(values)
+    found = {}
+    for start in range(0, len(values), LOOKUP_CHUNK):
+        found.update(queryset.filter(**{
+            f"{field}__in": values[start:start + LOOKUP_CHUNK]
+        }).values_list(field, "pk"))
+    return found
+
+
+class Command(BaseCommand):
+    help = ("Load an export_content NDJSON stream in batches. Posts and "
+            "comments get new ids, so the target may already have content; "
+            "running the same import twice duplicates them. With --keep-ids "
+            "they keep their source ids and rows that already exist are "
+            "skipped, so an interrupted import can simply be run again.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-",
+                            help="Input file, stdin by default.")
+        parser.add_argument("--gzip", action="store_true",
+                            help="Decompress even without a .gz suffix.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--keep-ids", action="store_true",
+                            help="Keep post and comment ids. Fails if an "
+                                 "id is taken by a different row.")
+
+    def user_ids(self, usernames):
+        """Ids of the authors of a batch; unknown ones are created without
+        a usable password."""
+        usernames = set(usernames)
+        ids = lookup(User.objects.all(), "username", usernames)
+        missing = usernames - set(ids)
+        if missing:
+            password = make_password(None)
+            User.objects.bulk_create(
+                (User(username=username, password=password)
+                 for username in missing),
+                ignore_conflicts=True
+            )
+            created = lookup(User.objects.all(), "username", missing)
+            ids.update(created)
+            self.created_users += len(created)
+            self.touched.update(created.values())
+        return ids
+
+    def load_group(self, records):
+        existing = lookup(Group.objects.all(), "slug",
+                          (record["slug"] for record in records))
+        Group.objects.bulk_create(
+            (Group(**record) for record in records
+             if record["slug"] not in existing), ignore_conflicts=True
+        )
+        return len(records) - len(existing)
+
+    def existing(self, model, records, fields):
+        """Source ids of ``records`` already stored by a previous run.
+
+        ``fields`` maps record keys to a model lookup and a parser. An id
+        taken by a row that differs in them means the target has content
+        of its own, and keeping ids would mix the two up.
+        """
+        ids = [record["id"] for record in records]
+        stored = {}
+        for start in range(0, len(ids), LOOKUP_CHUNK):
+            stored.update(
+                (row[0], row[1:]) for row in model.objects.filter(
+                    pk__in=ids[start:start + LOOKUP_CHUNK]
+                ).values_list("pk", *(field for field, _ in fields.values()))
+            )
+        for record in records:
+            row = stored.get(record["id"])
+            if row is not None and row != tuple(
+                    parse(record[name])
+                    for name, (_, parse) in fields.items()):
+                raise CommandError(
+                    f"{model._meta.verbose_name} {record['id']} already "
+                    f"exists with different content, import without "
+                    f"--keep-ids."
+                )
+        return set(stored)
+
+    def new_ids(self, model, records):
+        """Map the source ids of ``records`` to ids free in the target.
+
+        SQLite cannot return the ids of bulk-inserted rows, so they are
+        picked here; the batch runs under write_transaction, which holds
+        the write lock from the start, so nobody takes them meanwhile.
+        """
+        start = model.objects.aggregate(last=Max("pk"))["last"] or 0
+        return {record["id"]: start + number
+                for number, record in enumerate(records, 1)}
+
+    def remember_post_ids(self, ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {POST_IDS_TABLE} (source, target) "
+                f"VALUES (%s, %s)", list(ids.items())
+            )
+
+    def imported_post_ids(self, sources):
+        """Map the source ids of posts of this import to their new ids."""
+        sources = list(sources)
+        found = {}
+        with connection.cursor() as cursor:
+            for start in range(0, len(sources), LOOKUP_CHUNK):
+                chunk = sources[start:start + LOOKUP_CHUNK]
+                cursor.execute(
+                    f"SELECT source, target FROM {POST_IDS_TABLE} "
+                    f"WHERE source IN ({', '.join(['%s'] * len(chunk))})",
+                    chunk
+                )
+                found.update(cursor.fetchall())
+        return found
+
+    def load_post(self, records):
+        if self.keep_ids:
+            existing = self.existing(Post, records, {
+                "author": ("author__username", str),
+                "pub_date": ("pub_date", parse_datetime),
+            })
+            ids = {record["id"]: record["id"] for record in records
+                   if record["id"] not in existing}
+        else:
+            ids = self.new_ids(Post, records)
+            self.remember_post_ids(ids)
+        users = self.user_ids(record["author"] for record in records)
+        groups = lookup(Group.objects.all(), "slug",
+                        {record["group"] for record in records
+                         if record["group"]})
+        Post.objects.bulk_create((
+            Post(id=ids[record["id"]], text=record["text"],
+                 pub_date=parse_datetime(record["pub_date"]),
+                 author_id=users[record["author"]],
+                 group_id=groups.get(record["group"]),
+                 image=record["image"] or None,
+                 image_hash=record["image_hash"])
+            for record in records if record["id"] in ids
+        ), ignore_conflicts=True)
+        for record in records:
+            if record["id"] in ids:
+                author = users[record["author"]]
+                self.loaded_posts.setdefault(author, []).append(
+                    ids[record["id"]]
+                )
+        self.touched.update(self.loaded_posts)
+        return len(ids)
+
+    def load_comment(self, records):
+        if self.keep_ids:
+            existing = self.existing(Comment, records, {
+                "post": ("post_id", int),
+                "created": ("created", parse_datetime),
+            })
+            records = [record for record in records
+                       if record["id"] not in existing]
+            posts = lookup(Post.objects.all(), "pk",
+                           {record["post"] for record in records})
+        else:
+            # Only posts of this import; a local post with the same id is
+            # a different one.
+            posts = self.imported_post_ids(
+                {record["post"] for record in records}
+            )
+        records = [record for record in records if record["post"] in posts]
+        users = self.user_ids(record["author"] for record in records)
+        Comment.objects.bulk_create((
+            Comment(id=record["id"] if self.keep_ids else None,
+                    post_id=posts[record["post"]],
+                    author_id=users[record["author"]], text=record["text"],
+                    created=parse_datetime(record["created"]))
+            for record in records
+        ), ignore_conflicts=True)
+        return len(records)
+
+    def load_follow(self, records):
+        users = self.user_ids(
+            username for record in records
+            for username in (record["user"], record["author"])
+        )
+        pairs = {(users[record["user"]], users[record["author"]])
+                 for record in records}
+        followers = list({user for user, _ in pairs})
+        existing = set()
+        for start in range(0, len(followers), LOOKUP_CHUNK):
+            existing.update(Follow.objects.filter(
+                user_id__in=followers[start:start + LOOKUP_CHUNK]
+            ).values_list("user_id", "author_id"))
+        self.loaded_follows = pairs - existing
+        Follow.objects.bulk_create((
+            Follow(user_id=user, author_id=author)
+            for user, author in self.loaded_follows
+        ), ignore_conflicts=True)
+        for pair in self.loaded_follows:
+            self.touched.update(pair)
+        return len(self.loaded_follows)
+
+    def load(self, kind, records):
+        # Runs again from scratch when write_transaction retries.
+        self.created_users = 0
+        self.touched, self.loaded_posts, self.loaded_follows = set(), {}, set()
+        inserted = getattr(self, f"load_{kind}")(records)
+        # bulk_create skips signals: recount the stats of the users whose
+        # posts or follows changed along with the rows.
+        touched = list(self.touched)
+        for start in range(0, len(touched), LOOKUP_CHUNK):
+            stats.recount(touched[start:start + LOOKUP_CHUNK])
+        return inserted
+
+    def update_timelines(self):
+        """Do the fan-out and backfill the signals would have done.
+
+        Each goes through write transactions of its own, after the batch
+        is committed, like the background tasks.
+        """
+        for author, post_ids in self.loaded_posts.items():
+            timeline.fan_out_posts(author, post_ids)
+        for user, author in self.loaded_follows:
+            timeline.backfill(user, author)
+
+    def flush(self, kind, records):
+        if records:
+            inserted = write_transaction(self.load, kind, records)
+            self.update_timelines()
+            if self.created_users:
+                self.progress.add("user", self.created_users)
+            self.progress.add(kind, inserted,
+                              skipped=len(records) - inserted)
+
+    def read(self, stream, batch_size):
+        kind, records = None, []
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                record_kind = record.pop("model")
+            except (ValueError, AttributeError, KeyError):
+                raise CommandError(f"Line {number} is not a record.")
+            if set(record) != set(RECORDS.get(record_kind, ())):
+                raise CommandError(
+                    f"Line {number} is not a valid {record_kind} record."
+                )
+            if record_kind != kind or len(records) >= batch_size:
+                self.flush(kind, records)
+                kind, records = record_kind, []
+            records.append(record)
+        self.flush(kind, records)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        self.keep_ids = options["keep_ids"]
+        self.progress = Progress(self.stdout)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE {POST_IDS_TABLE} "
+                f"(source INTEGER PRIMARY KEY, target INTEGER NOT NULL)"
+            )
+        try:
+            with open_stream(path, "rt", options["gzip"]) as stream, \
+                    explicit_dates(Post._meta.get_field("pub_date"),
+                                   Comment._meta.get_field("created")):
+                self.read(stream, options["batch_size"])
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f"DROP TABLE {POST_IDS_TABLE}")
+        self.progress.report("Imported")
+        cache.clear()
+        self.stdout.write("Run pregenerate_thumbnails once the media files "
+                          "are in place.")
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts.cards import card_cache_stats, reset_card_cache_stats
+
+
+class Command(BaseCommand):
+    help = "Show hit/miss counters of the post card fragment cache."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true",
+                            help="Reset the counters after printing them.")
+
+    def handle(self, *args, **options):
+        stats = card_cache_stats()
+        self.stdout.write(
+            f"hits {stats['hits']}  misses {stats['misses']}  "
+            f"hit ratio {stats['ratio']:.1%}"
+        )
+        if options["reset"]:
+            reset_card_cache_stats()
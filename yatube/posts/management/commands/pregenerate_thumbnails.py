@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ("Create missing post thumbnails and store their metadata on "
+            "the posts.")
+
+    def handle(self, *args, **options):
+        posts = Post.objects.exclude(image="").exclude(
+            image__isnull=True
+        ).values_list("pk", flat=True)
+        count = 0
+        for post_id in posts.iterator():
+            if thumbnails.pregenerate(post_id) is not None:
+                count += 1
+        self.stdout.write(f"Processed images of {count} posts.")
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+from posts.models import Follow, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized follow timelines from Follow and Post."
+
+    def handle(self, *args, **options):
+        TimelineEntry.objects.all().delete()
+        follows = Follow.objects.values_list("user_id", "author_id")
+        count = 0
+        for user_id, author_id in follows.iterator():
+            timeline.backfill(user_id, author_id)
+            count += 1
+        self.stdout.write(f"Rebuilt timelines for {count} follows.")
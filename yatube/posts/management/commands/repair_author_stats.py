@@ -0,0 +1,49 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts.models import AuthorStats
+from posts.stats import COUNTERS, with_true_counts
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Re-check denormalized author stats and repair any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Report drift without fixing it.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        users = with_true_counts(User.objects.select_related("stats"))
+        missing, drifted = [], []
+        for user in users.iterator(chunk_size=options["batch_size"]):
+            expected = {counter: getattr(user, f"true_{counter}")
+                        for counter in COUNTERS}
+            try:
+                stats = user.stats
+            except AuthorStats.DoesNotExist:
+                missing.append(AuthorStats(user=user, **expected))
+                continue
+            actual = {counter: getattr(stats, counter)
+                      for counter in COUNTERS}
+            if actual != expected:
+                self.stdout.write(
+                    f"{user.username}: {actual} -> {expected}"
+                )
+                for counter, value in expected.items():
+                    setattr(stats, counter, value)
+                drifted.append(stats)
+        if not options["dry_run"]:
+            # An explicit batch size would bypass the backend's limit on
+            # rows per INSERT, which is 500 on SQLite.
+            AuthorStats.objects.bulk_create(missing, ignore_conflicts=True)
+            AuthorStats.objects.bulk_update(
+                drifted, COUNTERS, batch_size=options["batch_size"]
+            )
+        action = "Found" if options["dry_run"] else "Repaired"
+        self.stdout.write(
+            f"{action} {len(drifted)} drifted and {len(missing)} missing "
+            f"stats rows."
+        )
@@ -0,0 +1,181 @@
+import datetime
+import random
+from contextlib import contextmanager
+from io import StringIO
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+WORDS = (
+    "пост текст лента автор группа подписка новость фото день вечер город "
+    "работа отпуск кофе книга фильм музыка код релиз тест идея"
+).split()
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Let bulk_create keep our dates instead of auto_now_add ones."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = ("Bulk-generate users, groups, posts, comments and follows with "
+            "power-law skew for benchmarking.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--groups", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=50000)
+        parser.add_argument("--comments", type=int, default=100000)
+        parser.add_argument("--follows", type=int, default=20000)
+        parser.add_argument("--days", type=int, default=365,
+                            help="Spread publication dates over this span.")
+        parser.add_argument("--alpha", type=float, default=1.2,
+                            help="Pareto shape; lower means more skew.")
+        parser.add_argument("--prefix", default="bench")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def weights(self, count):
+        """Cumulative Pareto weights, ready for random.choices."""
+        return list(accumulate(
+            self.random.paretovariate(self.alpha) for _ in range(count)
+        ))
+
+    def text(self, words):
+        return " ".join(self.random.choices(WORDS, k=words))
+
+    def dates(self, count, since):
+        span = (timezone.now() - since).total_seconds()
+        return sorted(since + datetime.timedelta(
+            seconds=self.random.uniform(0, span)
+        ) for _ in range(count))
+
+    def create_users(self, count):
+        password = make_password(None)
+        User.objects.bulk_create(
+            (User(username=f"{self.prefix}_user_{i}", password=password)
+             for i in range(count)),
+            batch_size=self.batch_size
+        )
+        return list(User.objects.filter(
+            username__startswith=f"{self.prefix}_user_"
+        ).values_list("pk", flat=True))
+
+    def create_groups(self, count):
+        Group.objects.bulk_create(
+            (Group(title=f"{self.prefix} группа {i}",
+                   slug=f"{self.prefix}-group-{i}",
+                   description=self.text(12))
+             for i in range(count)),
+            batch_size=self.batch_size
+        )
+        return list(Group.objects.filter(
+            slug__startswith=f"{self.prefix}-group-"
+        ).values_list("pk", flat=True))
+
+    def create_posts(self, count, users, groups, since):
+        # A few prolific authors write most posts, a few groups get most of
+        # the grouped ones.
+        authors = self.random.choices(
+            users, cum_weights=self.weights(len(users)), k=count
+        )
+        group_weights = self.weights(len(groups))
+
+        def pick_group():
+            if not groups or self.random.random() > 0.6:
+                return None
+            return self.random.choices(groups, cum_weights=group_weights)[0]
+
+        posts = (
+            Post(text=self.text(self.random.randint(5, 60)),
+                 author_id=author_id, pub_date=pub_date,
+                 group_id=pick_group())
+            for author_id, pub_date in zip(authors,
+                                           self.dates(count, since))
+        )
+        Post.objects.bulk_create(posts, batch_size=self.batch_size)
+        return list(Post.objects.filter(
+            author__username__startswith=f"{self.prefix}_user_",
+            pub_date__gte=since
+        ).values_list("pk", "pub_date"))
+
+    def create_comments(self, count, users, posts):
+        if not posts:
+            return
+        # Comments pile up on a handful of viral posts.
+        targets = self.random.choices(
+            posts, cum_weights=self.weights(len(posts)), k=count
+        )
+        now = timezone.now()
+        comments = (
+            Comment(post_id=post_id, author_id=self.random.choice(users),
+                    text=self.text(self.random.randint(3, 20)),
+                    created=pub_date
+                    + (now - pub_date) * self.random.random())
+            for post_id, pub_date in targets
+        )
+        Comment.objects.bulk_create(comments, batch_size=self.batch_size)
+
+    def create_follows(self, count, users):
+        # Follower counts follow a power law: popular authors are picked
+        # far more often.
+        popularity = self.weights(len(users))
+        pairs = set(Follow.objects.filter(
+            user__username__startswith=f"{self.prefix}_user_"
+        ).values_list("user_id", "author_id"))
+        existing = len(pairs)
+        attempts = 0
+        while len(pairs) - existing < count and attempts < count * 10:
+            attempts += 1
+            user_id = self.random.choice(users)
+            author_id = self.random.choices(users,
+                                            cum_weights=popularity)[0]
+            if user_id != author_id:
+                pairs.add((user_id, author_id))
+        Follow.objects.bulk_create(
+            (Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in pairs),
+            batch_size=self.batch_size, ignore_conflicts=True
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.alpha = options["alpha"]
+        self.batch_size = options["batch_size"]
+        self.prefix = options["prefix"]
+        since = timezone.now() - datetime.timedelta(days=options["days"])
+        with transaction.atomic(), explicit_dates(
+            Post._meta.get_field("pub_date"),
+            Comment._meta.get_field("created"),
+        ):
+            users = self.create_users(options["users"])
+            groups = self.create_groups(options["groups"])
+            posts = self.create_posts(options["posts"], users, groups, since)
+            self.create_comments(options["comments"], users, posts)
+            self.create_follows(options["follows"], users)
+        # bulk_create skips signals, so rebuild everything they maintain.
+        call_command("repair_author_stats", stdout=StringIO())
+        call_command("rebuild_timelines", stdout=StringIO())
+        cache.clear()
+        self.stdout.write(
+            f"Seeded {len(users)} users, {len(groups)} groups, "
+            f"{len(posts)} posts, {options['comments']} comments and "
+            f"{options['follows']} follows."
+        )
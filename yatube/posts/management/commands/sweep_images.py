@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+
+
+class Command(BaseCommand):
+    help = ("Delete images and thumbnails that posts stopped using more "
+            "than --grace seconds ago and that no post refers to. Run it "
+            "periodically, e.g. from cron.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--grace", type=int,
+                            default=settings.IMAGE_RELEASE_GRACE)
+
+    def handle(self, *args, **options):
+        count = thumbnails.sweep_images(options["grace"])
+        self.stdout.write(f"Settled {count} released images.")
@@ -0,0 +1,23 @@
+# Generated by Django 2.2.6 on 2026-10-17 17:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_auto_20261017_1613'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='image_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_renditions',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
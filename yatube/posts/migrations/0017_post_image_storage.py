@@ -0,0 +1,19 @@
+# Generated by Django 2.2.6 on 2026-10-17 17:19
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_image_renditions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, null=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/'),
+        ),
+    ]
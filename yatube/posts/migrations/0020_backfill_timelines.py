@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+def backfill(apps, schema_editor):
+    # 0012 only created the table; fill it for every existing follow in a
+    # single INSERT ... SELECT, so the "timeline" feed engine starts out
+    # complete. Entries fanned out since then are replaced.
+    Follow = apps.get_model("posts", "Follow")
+    Post = apps.get_model("posts", "Post")
+    TimelineEntry = apps.get_model("posts", "TimelineEntry")
+    quote = schema_editor.quote_name
+    timeline = quote(TimelineEntry._meta.db_table)
+    schema_editor.execute(f"DELETE FROM {timeline}")
+    schema_editor.execute(
+        f"INSERT INTO {timeline} (user_id, post_id, author_id, pub_date) "
+        f"SELECT f.user_id, p.id, p.author_id, p.pub_date "
+        f"FROM {quote(Follow._meta.db_table)} f "
+        f"JOIN {quote(Post._meta.db_table)} p ON p.author_id = f.author_id"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_post_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
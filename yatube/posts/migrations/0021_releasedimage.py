@@ -0,0 +1,21 @@
+# Generated by Django 2.2.6 on 2026-10-17 18:20
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_backfill_timelines'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReleasedImage',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('released', models.DateTimeField(db_index=True, default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count
+
+
+def counts(queryset, field):
+    return dict(queryset.values(field).annotate(
+        count=Count("pk")
+    ).values_list(field, "count"))
+
+
+def fill(apps, schema_editor):
+    # 0013 created the table empty and rows were built on first read,
+    # possibly from a lagging replica. Create every missing row here from
+    # the primary instead.
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Post = apps.get_model("posts", "Post")
+    Follow = apps.get_model("posts", "Follow")
+    AuthorStats = apps.get_model("posts", "AuthorStats")
+    posts = counts(Post.objects.all(), "author")
+    followers = counts(Follow.objects.all(), "author")
+    following = counts(Follow.objects.all(), "user")
+    missing = User.objects.exclude(
+        pk__in=AuthorStats.objects.values("user_id")
+    ).values_list("pk", flat=True)
+    AuthorStats.objects.bulk_create(
+        AuthorStats(user_id=pk, posts_count=posts.get(pk, 0),
+                    followers_count=followers.get(pk, 0),
+                    following_count=following.get(pk, 0))
+        for pk in missing.iterator()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0021_releasedimage'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,12 @@
+import json
+
 from django.contrib.auth import get_user_model
 from django.db import models
 from django.db.models.deletion import CASCADE
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.storage import ContentAddressedStorage
 
 
 User = get_user_model()
@@ -15,6 +21,23 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Posts with author, group and comment count in a single query.
+
+        The count is a correlated subquery rather than JOIN + GROUP BY, so
+        LIMIT is applied before any comments are counted.
+        """
+        comments_count = Comment.objects.filter(
+            post=models.OuterRef("pk")
+        ).order_by().values("post").annotate(
+            count=models.Count("pk")
+        ).values("count")
+        return self.select_related("author", "group").annotate(
+            comments_count=Coalesce(models.Subquery(comments_count), 0)
+        )
+
+
 class Post(models.Model):
     text = models.TextField()
     pub_date = models.DateTimeField("date published", auto_now_add=True)
@@ -22,14 +45,44 @@ class Post(models.Model):
                                related_name="posts")
     group = models.ForeignKey(Group, blank=True, null=True,
                               on_delete=models.SET_NULL, related_name="posts")
-    image = models.ImageField(upload_to='posts/', blank=True, null=True)
+    image = models.ImageField(upload_to='posts/', blank=True, null=True,
+                              storage=ContentAddressedStorage(),
+                              db_index=True)
+    version = models.PositiveIntegerField(default=1, editable=False)
+    # Written by posts.thumbnails once the image has been processed.
+    image_hash = models.CharField(max_length=64, blank=True, editable=False)
+    image_renditions = models.TextField(blank=True, editable=False)
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    image_placeholder = models.TextField(blank=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ["-pub_date"]
+        indexes = (
+            models.Index(fields=["-pub_date", "-id"],
+                         name="post_pub_date_idx"),
+            models.Index(fields=["author", "-pub_date", "-id"],
+                         name="post_author_pub_date_idx"),
+            models.Index(fields=["group", "-pub_date", "-id"],
+                         name="post_group_pub_date_idx"),
+        )
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def renditions(self):
+        return json.loads(self.image_renditions or "{}")
+
+    def rendition(self, geometry):
+        """Stored thumbnail of the current image, or None if not ready."""
+        renditions = self.renditions
+        if renditions.get("source") != self.image.name:
+            return None
+        return renditions["sizes"].get(geometry)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE,
@@ -39,6 +92,12 @@ class Comment(models.Model):
     text = models.TextField(blank=False, null=True)
     created = models.DateTimeField("date published", auto_now_add=True)
 
+    class Meta:
+        indexes = (
+            models.Index(fields=["post", "created", "id"],
+                         name="comment_post_created_idx"),
+        )
+
 
 class Follow(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE,
@@ -51,3 +110,49 @@ class Follow(models.Model):
             models.UniqueConstraint(fields=["user", "author"],
                                     name="uniq_follow"),
         )
+        indexes = (
+            models.Index(fields=["author", "user"],
+                         name="follow_author_user_idx"),
+        )
+
+
+class TimelineEntry(models.Model):
+    """Materialized follow feed: one row per (follower, post)."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name="timeline")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name="timeline_entries")
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name="+")
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=["user", "post"],
+                                    name="uniq_timeline_entry"),
+        )
+        indexes = (
+            models.Index(fields=["user", "-pub_date", "-post"],
+                         name="timeline_user_pub_date_idx"),
+            models.Index(fields=["user", "author"],
+                         name="timeline_user_author_idx"),
+        )
+
+
+class ReleasedImage(models.Model):
+    """An image a post stopped referring to.
+
+    sweep_images deletes it once IMAGE_RELEASE_GRACE has passed, unless a
+    post refers to it again, see posts/thumbnails.py.
+    """
+    name = models.CharField(max_length=100, primary_key=True)
+    released = models.DateTimeField(default=timezone.now, db_index=True)
+
+
+class AuthorStats(models.Model):
+    """Denormalized counters shown in includes/author_stats.html."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name="stats")
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
@@ -0,0 +1,245 @@
+import hashlib
+import math
+import random
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from core import counters
+from core.db_router import read_replica
+
+from .models import Post
+
+GENERATION_KEY = "page_cache:generation:{}"
+MODIFIED_KEY = "page_cache:modified:{}"
+PAGE_KEY = "page_cache:page:{}:{}:{}:{}"
+LOCK_KEY = "{}:lock"
+
+# Bumped on changes that show up on every cached page (group titles).
+GLOBAL_SCOPE = "global"
+
+
+def page_state(scopes):
+    """Generations of ``scopes`` and the time of the last write to any.
+
+    Both come from a single cache read. The time is None if it was
+    evicted on its own.
+    """
+    keys = [GENERATION_KEY.format(scope) for scope in scopes]
+    modified_keys = [MODIFIED_KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys + modified_keys)
+    for key, modified_key in zip(keys, modified_keys):
+        if key not in found:
+            found[key] = counters.start(key)
+            cache.add(modified_key, time.time(), None)
+            found[modified_key] = cache.get(modified_key)
+    stamps = [found.get(key) for key in modified_keys]
+    last_modified = None if None in stamps else max(stamps)
+    return [found[key] for key in keys], last_modified
+
+
+def generations(scopes):
+    return page_state(scopes)[0]
+
+
+def invalidate(*scopes):
+    for scope in scopes:
+        counters.bump(GENERATION_KEY.format(scope))
+    now = time.time()
+    cache.set_many({MODIFIED_KEY.format(scope): now for scope in scopes},
+                   None)
+
+
+def invalidate_post(post):
+    scopes = ["index", f"profile:{post.author.username}"]
+    if post.group_id is not None:
+        scopes.append(f"group:{post.group.slug}")
+    invalidate(*scopes)
+
+
+def post_scopes(**filters):
+    """Scopes of the pages showing any post matching ``filters``.
+
+    Authors and groups are read in one query, each only once.
+    """
+    scopes = set()
+    for username, slug in Post.objects.filter(**filters).values_list(
+            "author__username", "group__slug").distinct():
+        scopes.update(("index", f"profile:{username}"))
+        if slug:
+            scopes.add(f"group:{slug}")
+    return scopes
+
+
+def invalidate_posts(**filters):
+    """Invalidate the pages showing any post matching ``filters``."""
+    scopes = post_scopes(**filters)
+    if scopes:
+        invalidate(*scopes)
+
+
+def page_cache_key(request, name, scope):
+    viewer = request.user.pk if request.user.is_authenticated else "anon"
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return PAGE_KEY.format(name, scope, viewer, path)
+
+
+def page_etag(request, name, generation):
+    viewer = request.user.pk if request.user.is_authenticated else "anon"
+    raw = f"{name}:{viewer}:{generation}"
+    return f'W/"{hashlib.md5(raw.encode()).hexdigest()}"'
+
+
+def _not_modified(request, etag, last_modified):
+    # Only the ETag is checked: it names the viewer, while a date is the
+    # same for everyone and would revalidate another viewer's copy.
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        response = _set_validators(response, etag, last_modified)
+    return response
+
+
+def _may_be_stale(last_modified):
+    """Whether the page was read from a replica that may lag behind."""
+    return read_replica() and (
+        last_modified is None
+        or time.time() - last_modified < settings.REPLICA_MAX_LAG
+    )
+
+
+def _set_validators(response, etag, last_modified):
+    if response.status_code not in (200, 304) or _may_be_stale(
+            last_modified):
+        return response
+    response["ETag"] = etag
+    # Clients and proxies may keep the page, but must ask again.
+    patch_cache_control(response, no_cache=True)
+    return response
+
+
+class CachedPage:
+    """A cached response with the generation and timing it was built at."""
+
+    def __init__(self, response, generation, delta):
+        self.response = response
+        self.generation = generation
+        self.delta = delta
+        self.expires = time.time() + settings.PAGE_CACHE_TIMEOUT
+
+    def is_fresh(self, generation):
+        if self.generation != generation:
+            return False
+        # Probabilistic early expiration (XFetch): the closer to expiry
+        # and the slower the page is to build, the likelier a refresh.
+        jitter = -self.delta * settings.PAGE_CACHE_EARLY_REFRESH_BETA * (
+            math.log(random.random() or 1e-12)
+        )
+        return time.time() + jitter < self.expires
+
+
+def _compute(view, request, args, kwargs, key, generation, validators):
+    started = time.monotonic()
+    response = _set_validators(view(request, *args, **kwargs), *validators)
+    if (response.status_code == 200 and not response.cookies
+            and not _may_be_stale(validators[1])):
+        entry = CachedPage(response, generation, time.monotonic() - started)
+        cache.set(key, entry, settings.PAGE_CACHE_TIMEOUT
+                  + settings.PAGE_CACHE_STALE_TIMEOUT)
+    return response
+
+
+def _wait_for(key, lock, generation):
+    """The page another worker is building, or None once it gave up.
+
+    The lock holder may not store what it built (a 404, a page setting
+    cookies, a possibly stale replica read), so waiting stops as soon as
+    the lock is released.
+    """
+    deadline = time.monotonic() + settings.PAGE_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        found = cache.get_many([key, lock])
+        entry = found.get(key)
+        if entry is not None and entry.generation == generation:
+            return entry.response
+        if lock not in found:
+            return None
+    return None
+
+
+def cache_by_generation(scope):
+    """Cache a GET view until a write bumps the generation of ``scope``.
+
+    ``scope`` is formatted with the view kwargs, e.g. ``"group:{slug}"``.
+    Pages vary on the viewer, since they show per-user controls.
+
+    Rebuilds are single-flight: the worker that takes the lock recomputes
+    the page while the others keep serving the stale copy, or wait for the
+    new one if there is none.
+
+    Pages carry an ETag derived from the viewer and the generations, and
+    a request that still holds the current one gets a 304 before the
+    cache, the database or the templates are touched. There is no
+    Last-Modified: a date cannot tell viewers apart.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+            page_scope = scope.format(**kwargs)
+            generation, last_modified = page_state([page_scope,
+                                                    GLOBAL_SCOPE])
+            validators = (page_etag(request, view.__name__, generation),
+                          last_modified)
+            response = _not_modified(request, *validators)
+            if response is not None:
+                return response
+            key = page_cache_key(request, view.__name__, page_scope)
+            entry = cache.get(key)
+            if entry is not None and entry.is_fresh(generation):
+                return entry.response
+            lock = LOCK_KEY.format(key)
+            if cache.add(lock, 1, settings.PAGE_CACHE_LOCK_TIMEOUT):
+                try:
+                    return _compute(view, request, args, kwargs, key,
+                                    generation, validators)
+                finally:
+                    cache.delete(lock)
+            if entry is not None:
+                return entry.response
+            response = _wait_for(key, lock, generation)
+            if response is not None:
+                return response
+            return _compute(view, request, args, kwargs, key, generation,
+                            validators)
+        return wrapper
+    return decorator
+
+
+def conditional_by_generation(scope):
+    """Answer 304 to GET and HEAD requests while ``scope`` is unchanged.
+
+    Like ``cache_by_generation`` without storing the page, for pages
+    that are cheap to build but still worth not sending again.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD"):
+                return view(request, *args, **kwargs)
+            generation, last_modified = page_state(
+                [scope.format(**kwargs), GLOBAL_SCOPE]
+            )
+            validators = (page_etag(request, view.__name__, generation),
+                          last_modified)
+            response = _not_modified(request, *validators)
+            if response is not None:
+                return response
+            return _set_validators(view(request, *args, **kwargs),
+                                   *validators)
+        return wrapper
+    return decorator
@@ -0,0 +1,140 @@
+import base64
+import binascii
+import datetime
+import json
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+POSTS_PER_PAGE = 10
+COMMENTS_PER_PAGE = 50
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """Keeps full microsecond precision, unlike DjangoJSONEncoder."""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def dump_cursor(values):
+    """Encode a list of boundary values as an opaque URL-safe token."""
+    raw = json.dumps(values, cls=CursorEncoder).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def load_cursor(token):
+    """Decode a token made by dump_cursor, or return None if it is broken."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    return values if isinstance(values, list) else None
+
+
+class CursorPaginator(Paginator):
+    """Keyset paginator over a unique ordering such as (-pub_date, -id).
+
+    Pages are addressed by opaque ``after``/``before`` tokens that encode
+    the ordering values of the boundary row, so every page is a single
+    indexed range read: no COUNT(*) and no OFFSET scan. Legacy ``?page=N``
+    links are still served, but without counting the whole table.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=("-pub_date", "-id")):
+        self.ordering = tuple(ordering)
+        super().__init__(object_list.order_by(*self.ordering), per_page)
+
+    def _fields(self):
+        model = self.object_list.model
+        for item in self.ordering:
+            name = item.lstrip("-")
+            field = (model._meta.pk if name == "pk"
+                     else model._meta.get_field(name))
+            yield field.attname, field, item.startswith("-")
+
+    def encode_cursor(self, obj):
+        return dump_cursor([getattr(obj, attname)
+                            for attname, _, _ in self._fields()])
+
+    def decode_cursor(self, token):
+        values = load_cursor(token)
+        fields = list(self._fields())
+        if values is None or len(values) != len(fields):
+            return None
+        try:
+            return [field.to_python(value)
+                    for (_, field, _), value in zip(fields, values)]
+        except (ValidationError, ValueError, TypeError):
+            return None
+
+    def _seek(self, values, forward):
+        condition = Q()
+        equal = {}
+        for (attname, _, descending), value in zip(self._fields(), values):
+            lookup = "lt" if descending == forward else "gt"
+            condition |= Q(**equal, **{f"{attname}__{lookup}": value})
+            equal[attname] = value
+        return condition
+
+    def _ordered(self, forward=True):
+        if forward:
+            return self.object_list.order_by(*self.ordering)
+        return self.object_list.order_by(*[
+            item[1:] if item.startswith("-") else f"-{item}"
+            for item in self.ordering
+        ])
+
+    def make_page(self, rows, number, has_previous, has_next):
+        page = self._get_page(rows, number, self)
+        page.previous_cursor = (self.encode_cursor(rows[0])
+                                if rows and has_previous else None)
+        page.next_cursor = (self.encode_cursor(rows[-1])
+                            if rows and has_next else None)
+        return page
+
+    def _number_page(self, number):
+        try:
+            number = max(int(number), 1)
+        except (TypeError, ValueError):
+            number = 1
+        offset = (number - 1) * self.per_page
+        rows = list(self._ordered()[offset:offset + self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        return self.make_page(rows[:self.per_page], number,
+                              number > 1, has_next)
+
+    def get_cursor_page(self, after=None, before=None, number=None):
+        if after:
+            values = self.decode_cursor(after)
+            if values is not None:
+                rows = list(self._ordered().filter(
+                    self._seek(values, forward=True)
+                )[:self.per_page + 1])
+                return self.make_page(rows[:self.per_page], None, True,
+                                      len(rows) > self.per_page)
+        if before:
+            values = self.decode_cursor(before)
+            if values is not None:
+                rows = list(self._ordered(forward=False).filter(
+                    self._seek(values, forward=False)
+                )[:self.per_page + 1])
+                has_previous = len(rows) > self.per_page
+                rows = rows[:self.per_page][::-1]
+                return self.make_page(rows, None, has_previous, True)
+        return self._number_page(number)
+
+
+def paginate(request, object_list, per_page=POSTS_PER_PAGE, **kwargs):
+    paginator = CursorPaginator(object_list, per_page, **kwargs)
+    return paginator.get_cursor_page(
+        after=request.GET.get("after"),
+        before=request.GET.get("before"),
+        number=request.GET.get("page"),
+    )
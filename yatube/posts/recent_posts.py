@@ -0,0 +1,108 @@
+import heapq
+from itertools import dropwhile, islice, takewhile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from core import counters
+
+from .models import Follow, Post
+from .pagination import POSTS_PER_PAGE, CursorPaginator
+
+VERSION_KEY = "posts:recent:version:{}"
+LIST_KEY = "posts:recent:{}:{}"
+
+
+def _versions(author_ids):
+    keys = {VERSION_KEY.format(author_id): author_id
+            for author_id in author_ids}
+    found = counters.current(list(keys))
+    return {author_id: found[key] for key, author_id in keys.items()}
+
+
+def _load(author_id):
+    return list(Post.objects.filter(author_id=author_id).order_by(
+        "-pub_date", "-id"
+    ).values_list("pub_date", "id")[:settings.RECENT_POSTS_LIMIT])
+
+
+def invalidate(author_id):
+    """Drop the author's cached list once the current transaction commits.
+
+    Lists are stored under a version that is bumped rather than edited in
+    place: a reader that loaded the list before the commit stores it
+    under the old version, where nobody looks any more.
+    """
+    transaction.on_commit(
+        lambda: counters.bump(VERSION_KEY.format(author_id))
+    )
+
+
+def recent_posts(author_ids):
+    """Return {author_id: [(pub_date, post_id), ...]} newest first."""
+    keys = {LIST_KEY.format(author_id, version): author_id
+            for author_id, version in _versions(author_ids).items()}
+    cached = cache.get_many(keys)
+    lists = {keys[key]: items for key, items in cached.items()}
+    missing = {}
+    for key, author_id in keys.items():
+        if author_id not in lists:
+            lists[author_id] = missing[key] = _load(author_id)
+    if missing:
+        cache.set_many(missing, settings.RECENT_POSTS_TIMEOUT)
+    return lists
+
+
+def _horizon(lists):
+    """Newest key below which a truncated list may be hiding posts."""
+    limit = settings.RECENT_POSTS_LIMIT
+    tails = [items[-1] for items in lists.values() if len(items) >= limit]
+    return max(tails) if tails else None
+
+
+def pull_page(request, per_page=POSTS_PER_PAGE):
+    """Follow feed built by k-way merging per-author recent post lists.
+
+    A page that reaches past the cached window of a truncated list falls
+    back to the join query, so deep pages stay correct.
+    """
+    post_list = Post.objects.for_feed().filter(
+        author__following__user=request.user
+    )
+    paginator = CursorPaginator(post_list, per_page)
+    after = request.GET.get("after")
+    before = request.GET.get("before")
+    if request.GET.get("page") and not (after or before):
+        return paginator.get_cursor_page(number=request.GET["page"])
+    author_ids = list(Follow.objects.filter(
+        user=request.user
+    ).values_list("author_id", flat=True))
+    lists = recent_posts(author_ids)
+    horizon = _horizon(lists)
+    merged = heapq.merge(*lists.values(), reverse=True)
+    fallback = paginator.get_cursor_page
+    if before:
+        cursor = paginator.decode_cursor(before)
+        if cursor is None or (horizon is not None
+                              and tuple(cursor) < horizon):
+            return fallback(before=before)
+        newer = list(takewhile(lambda key: key > tuple(cursor), merged))
+        keys = newer[-(per_page + 1):]
+        has_previous, has_next = len(keys) > per_page, True
+        keys = keys[-per_page:]
+    else:
+        cursor = paginator.decode_cursor(after) if after else None
+        if cursor is not None:
+            merged = dropwhile(lambda key: key >= tuple(cursor), merged)
+        keys = list(islice(merged, per_page + 1))
+        if horizon is not None and (len(keys) <= per_page
+                                    or keys[-1] < horizon):
+            return fallback(after=after)
+        has_previous, has_next = cursor is not None, len(keys) > per_page
+        keys = keys[:per_page]
+    posts = Post.objects.for_feed().in_bulk(
+        [post_id for _, post_id in keys]
+    )
+    rows = [posts[post_id] for _, post_id in keys if post_id in posts]
+    return paginator.make_page(rows, None, has_previous, has_next)
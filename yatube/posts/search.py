@@ -0,0 +1,143 @@
+import re
+
+from django.core.paginator import Page
+from django.db import connections, router
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .pagination import POSTS_PER_PAGE, dump_cursor, load_cursor
+
+# posts_post_fts is an external-content FTS5 table over posts_post, kept
+# in sync by triggers (migration 0019), so bulk_create and raw updates are
+# indexed too. Django's SQLite schema editor rebuilds a table on most
+# AlterField operations, dropping its triggers: such migrations on Post
+# must create them again. test_search checks that they exist.
+
+# Private-use characters mark snippet matches, so the post text can be
+# escaped before they become <mark> tags.
+MARK_START, MARK_END = "\ue000", "\ue001"
+SNIPPET_TOKENS = 24
+
+SEARCH_SQL = """
+    SELECT rank, rowid FROM posts_post_fts
+    WHERE posts_post_fts MATCH %s {seek}
+    ORDER BY rank {direction}, rowid {direction}
+    LIMIT %s
+"""
+
+MATCHING_SQL = "SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s"
+
+# Snippets are only built for the rows of the page.
+SNIPPET_SQL = f"""
+    SELECT rowid,
+           snippet(posts_post_fts, 0, '{MARK_START}', '{MARK_END}', '…',
+                   {SNIPPET_TOKENS})
+    FROM posts_post_fts
+    WHERE posts_post_fts MATCH %s AND rowid IN ({{ids}})
+"""
+
+
+def _cursor():
+    # Raw queries bypass the router, so ask it which copy to read.
+    return connections[router.db_for_read(Post)].cursor()
+
+
+def match_expression(query):
+    """Turn free user input into a safe FTS5 query.
+
+    Every word must match; the last one also matches as a prefix, so
+    results show up while the user is still typing.
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet).replace(MARK_START, "<mark>")
+                       .replace(MARK_END, "</mark>")
+    )
+
+
+def matching_ids(match):
+    """Subquery of the ids of matching posts, for ``pk__in`` filters."""
+    return RawSQL(MATCHING_SQL, [match])
+
+
+def ranked(match, seek=None, forward=True, limit=POSTS_PER_PAGE):
+    """(rank, post_id) pairs in bm25 order after the ``seek`` pair."""
+    params = [match]
+    condition = ""
+    if seek is not None:
+        # Lower rank is better; ties are broken by rowid.
+        sign = ">" if forward else "<"
+        condition = (f"AND (rank {sign} %s "
+                     f"OR (rank = %s AND rowid {sign} %s))")
+        params += [seek[0], seek[0], seek[1]]
+    sql = SEARCH_SQL.format(seek=condition,
+                            direction="ASC" if forward else "DESC")
+    with _cursor() as cursor:
+        cursor.execute(sql, params + [limit])
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+def snippets(match, ids):
+    if not ids:
+        return {}
+    sql = SNIPPET_SQL.format(ids=", ".join(["%s"] * len(ids)))
+    with _cursor() as cursor:
+        cursor.execute(sql, [match, *ids])
+        return {post_id: highlight(snippet)
+                for post_id, snippet in cursor.fetchall()}
+
+
+def _cursor_values(token):
+    values = load_cursor(token) if token else None
+    if (values is None or len(values) != 2
+            or not isinstance(values[0], (int, float))
+            or not isinstance(values[1], int)):
+        return None
+    return values
+
+
+def search_page(request, query, per_page=POSTS_PER_PAGE):
+    """A page of posts matching ``query``, best ranked first.
+
+    Pages are addressed by ``after``/``before`` cursors over (rank, id),
+    like the feeds. Every post gets a highlighted ``snippet``.
+    """
+    match = match_expression(query)
+    if match is None:
+        page = Page([], 1, None)
+        page.previous_cursor = page.next_cursor = None
+        return page
+    before = _cursor_values(request.GET.get("before"))
+    after = _cursor_values(request.GET.get("after"))
+    if before is not None:
+        rows = ranked(match, before, forward=False, limit=per_page + 1)
+        has_previous, has_next = len(rows) > per_page, True
+        rows = rows[:per_page][::-1]
+    else:
+        rows = ranked(match, after, limit=per_page + 1)
+        has_previous, has_next = after is not None, len(rows) > per_page
+        rows = rows[:per_page]
+    ids = [post_id for _, post_id in rows]
+    posts = Post.objects.for_feed().in_bulk(ids)
+    highlighted = snippets(match, ids)
+    object_list = []
+    for post_id in ids:
+        if post_id in posts:
+            posts[post_id].snippet = highlighted.get(post_id, "")
+            object_list.append(posts[post_id])
+    page = Page(object_list, None, None)
+    page.previous_cursor = (dump_cursor(list(rows[0]))
+                            if rows and has_previous else None)
+    page.next_cursor = (dump_cursor(list(rows[-1]))
+                        if rows and has_next else None)
+    return page
@@ -0,0 +1,137 @@
+from django.conf import settings
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import cards, page_cache, recent_posts, stats, thumbnails, timeline
+from .models import AuthorStats, Comment, Follow, Group, Post
+
+
+def timeline_enabled():
+    return settings.FOLLOW_FEED_ENGINE == "timeline"
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        recent_posts.invalidate(instance.author_id)
+        if timeline_enabled():
+            timeline.schedule(timeline.fan_out, instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, raw, **kwargs):
+    if instance.image and not raw:
+        thumbnails.schedule(instance)
+
+
+@receiver(post_delete, sender=Post)
+def forget_deleted_post(sender, instance, **kwargs):
+    recent_posts.invalidate(instance.author_id)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created and timeline_enabled():
+        # An author may have thousands of posts; copy them after commit
+        # like fan-out. Each batch checks that the follow still exists.
+        timeline.schedule(timeline.backfill, instance.user_id,
+                          instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def prune_timeline(sender, instance, **kwargs):
+    if timeline_enabled():
+        timeline.schedule(timeline.prune, instance.user_id,
+                          instance.author_id)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_author_stats(sender, instance, created, raw, **kwargs):
+    if created and not raw:
+        AuthorStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def count_new_post(sender, instance, created, **kwargs):
+    if created:
+        stats.bump(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    stats.bump(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_new_follow(sender, instance, created, **kwargs):
+    if created:
+        stats.bump(instance.author_id, followers_count=1)
+        stats.bump(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    stats.bump(instance.author_id, followers_count=-1)
+    stats.bump(instance.user_id, following_count=-1)
+
+
+@receiver(pre_save, sender=Post)
+def bump_edited_post_version(sender, instance, raw, **kwargs):
+    if instance.pk is not None and not raw:
+        instance.version += 1
+        old_group, old_image = Post.objects.filter(
+            pk=instance.pk
+        ).values_list("group__slug", "image").first() or (None, None)
+        if old_group:
+            page_cache.invalidate(f"group:{old_group}")
+        instance.replaced_image = old_image
+
+
+@receiver(post_save, sender=Post)
+def release_replaced_image(sender, instance, raw, **kwargs):
+    old_image = getattr(instance, "replaced_image", None)
+    if old_image and old_image != instance.image.name and not raw:
+        thumbnails.release_image(old_image)
+
+
+@receiver(post_delete, sender=Post)
+def release_deleted_image(sender, instance, **kwargs):
+    if instance.image:
+        thumbnails.release_image(instance.image.name)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        page_cache.invalidate_post(instance)
+
+
+# Comments have no post_delete receiver: it would stop Django from
+# fast-deleting them along with their post. CommentAdmin, the only place
+# that deletes single comments, invalidates their posts itself.
+@receiver(post_save, sender=Comment)
+def bump_commented_post_version(sender, instance, **kwargs):
+    cards.bump_versions(pk=instance.post_id)
+    page_cache.invalidate_posts(pk=instance.post_id)
+
+
+@receiver(post_save, sender=Group)
+def bump_group_posts_version(sender, instance, created, **kwargs):
+    if not created:
+        cards.bump_versions(group_id=instance.pk)
+        page_cache.invalidate(page_cache.GLOBAL_SCOPE)
+
+
+@receiver(pre_delete, sender=Group)
+def bump_ungrouped_posts_version(sender, instance, **kwargs):
+    cards.bump_versions(group_id=instance.pk)
+    page_cache.invalidate(page_cache.GLOBAL_SCOPE)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_follow_profiles(sender, instance, **kwargs):
+    page_cache.invalidate(f"profile:{instance.user.username}",
+                          f"profile:{instance.author.username}")
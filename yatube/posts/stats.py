@@ -0,0 +1,108 @@
+from django.contrib.auth import get_user_model
+from django.db import router
+from django.db.models import (BooleanField, Count, Exists, F, IntegerField,
+                              OuterRef, Subquery, Value)
+from django.db.models.functions import Coalesce, Greatest
+
+from core.sqlite import write_transaction
+
+from .models import AuthorStats, Follow, Post
+
+User = get_user_model()
+
+COUNTERS = ("posts_count", "followers_count", "following_count")
+
+
+def _count(queryset, field):
+    counted = queryset.filter(**{field: OuterRef("pk")}).order_by().values(
+        field
+    ).annotate(count=Count("pk")).values("count")
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+def with_true_counts(users):
+    """Annotate users with counters computed from Post and Follow."""
+    return users.annotate(
+        true_posts_count=_count(Post.objects.all(), "author"),
+        true_followers_count=_count(Follow.objects.all(), "author"),
+        true_following_count=_count(Follow.objects.all(), "user"),
+    )
+
+
+def with_author_header(queryset, viewer, author=""):
+    """Join what the author header shows into ``queryset``.
+
+    ``author`` is the path to the user, e.g. "author__" on posts. The
+    stats row is selected along, and ``header_following`` tells whether
+    ``viewer`` follows the author. Use author_header to read the result.
+    """
+    if viewer.is_authenticated:
+        following = Exists(Follow.objects.filter(
+            user_id=viewer.pk, author=OuterRef(f"{author}pk")
+        ))
+    else:
+        following = Value(False, output_field=BooleanField())
+    return queryset.select_related(f"{author}stats").annotate(
+        header_following=following
+    )
+
+
+def _create_stats(user_id):
+    # Count on the primary under the write lock: reads may come from a
+    # lagging replica, and a bump cannot land between count and insert.
+    using = router.db_for_write(AuthorStats)
+    counts = with_true_counts(
+        User.objects.using(using).filter(pk=user_id)
+    ).values(*(f"true_{counter}" for counter in COUNTERS)).get()
+    stats, _ = AuthorStats.objects.using(using).get_or_create(
+        user_id=user_id,
+        defaults={counter: counts[f"true_{counter}"]
+                  for counter in COUNTERS}
+    )
+    return stats
+
+
+def recount(user_ids):
+    """Set the stats rows of ``user_ids`` to their real counts.
+
+    Missing rows are created. Call it inside a write transaction, with
+    few enough ids for one query.
+    """
+    counts = {
+        pk: dict(zip(COUNTERS, values)) for pk, *values in with_true_counts(
+            User.objects.filter(pk__in=user_ids)
+        ).values_list("pk", *(f"true_{counter}" for counter in COUNTERS))
+    }
+    existing = list(AuthorStats.objects.filter(user_id__in=counts))
+    for stats in existing:
+        for counter, value in counts.pop(stats.user_id).items():
+            setattr(stats, counter, value)
+    AuthorStats.objects.bulk_update(existing, COUNTERS)
+    AuthorStats.objects.bulk_create(
+        AuthorStats(user_id=pk, **values) for pk, values in counts.items()
+    )
+
+
+def author_header(row, author):
+    """Context of includes/author_stats.html for a with_author_header row.
+
+    A missing stats row is created from real counts.
+    """
+    try:
+        stats = author.stats
+    except AuthorStats.DoesNotExist:
+        stats = write_transaction(_create_stats, author.pk)
+    return {"author": author, "stats": stats,
+            "following": row.header_following}
+
+
+def bump(user_id, **deltas):
+    """Atomically add ``deltas`` to the counters of an existing row.
+
+    Rows are never created here: a missing row is built from real counts
+    on first read, and a row of a user being deleted must stay deleted.
+    """
+    AuthorStats.objects.filter(user_id=user_id).update(**{
+        counter: Greatest(F(counter) + delta, 0)
+        for counter, delta in deltas.items()
+    })
@@ -0,0 +1,30 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from posts.cards import get_or_render
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def post_cards(context, posts):
+    """Render includes/post_item.html for each of ``posts`` via the card
+    cache, looking all of them up at once."""
+    user = context.get("user")
+    viewer_id = user.pk if user and user.is_authenticated else None
+    comment_button = context.get("comment_button") is not False
+    card = context.template.engine.get_template("includes/post_item.html")
+
+    def render(post):
+        with context.push(post=post):
+            return card.render(context)
+
+    return mark_safe("".join(
+        get_or_render(list(posts), viewer_id, comment_button, render)
+    ))
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post):
+    """Render includes/post_item.html for ``post`` via the card cache."""
+    return post_cards(context, [post])
@@ -0,0 +1,42 @@
+from collections import namedtuple
+
+from django import template
+from django.conf import settings
+from sorl.thumbnail import default
+
+from posts.thumbnails import srcset_key
+
+register = template.Library()
+
+Rendition = namedtuple(
+    "Rendition", "url width height srcset srcset_type placeholder"
+)
+
+
+@register.simple_tag
+def post_thumbnail(post, geometry):
+    """The pre-generated thumbnail of ``post.image``, or the image itself.
+
+    Reads only the metadata stored on the post by posts.thumbnails, so
+    rendering a card does no storage or key-value store I/O. ``srcset``
+    lists the THUMBNAIL_SRCSET_FORMAT renditions that are ready, and
+    ``placeholder`` is an inline preview to show while they load.
+    """
+    if not post.image:
+        return None
+    srcset_type = f"image/{settings.THUMBNAIL_SRCSET_FORMAT.lower()}"
+    rendition = post.rendition(geometry)
+    if rendition is None:
+        return Rendition(post.image.url, post.image_width,
+                         post.image_height, "", srcset_type,
+                         post.image_placeholder)
+    srcset = []
+    for width in settings.THUMBNAIL_SRCSET_WIDTHS:
+        candidate = post.rendition(srcset_key(geometry, width))
+        if candidate is not None:
+            srcset.append(f"{default.storage.url(candidate['name'])} "
+                          f"{candidate['width']}w")
+    return Rendition(default.storage.url(rendition["name"]),
+                     rendition["width"], rendition["height"],
+                     ", ".join(srcset), srcset_type,
+                     post.image_placeholder)
@@ -0,0 +1,152 @@
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import AuthorStats, Comment, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(ADMIN_COUNT_LIMIT=3, ADMIN_ACTION_CHUNK_SIZE=2)
+class PostAdminTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="admin"
+        )
+        cls.author = User.objects.create_user(username="author")
+        cls.group = Group.objects.create(title="Старая", slug="old",
+                                         description="описание")
+        cls.new_group = Group.objects.create(title="Новая", slug="new",
+                                             description="описание")
+        cls.posts = [
+            Post.objects.create(text=f"Пост про котов {number}",
+                                author=cls.author, group=cls.group)
+            for number in range(5)
+        ]
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+        self.url = reverse("admin:posts_post_changelist")
+
+    def test_changelist_does_not_count_whole_table(self):
+        """Тестирование оценки числа записей в списке постов"""
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["cl"].result_count,
+                         self.posts[-1].pk)
+        counts = [query["sql"] for query in context.captured_queries
+                  if "COUNT(" in query["sql"]]
+        self.assertTrue(all("LIMIT" in sql for sql in counts))
+        self.assertNotIn("DISTINCT", " ".join(
+            query["sql"] for query in context.captured_queries
+            if "posts_post" in query["sql"]
+        ))
+
+    def test_date_hierarchy(self):
+        """Тестирование навигации по датам без выборки всех дат"""
+        Post.objects.filter(pk=self.posts[0].pk).update(
+            pub_date=self.posts[0].pub_date.replace(year=2019)
+        )
+        years = [str(year) for year in
+                 range(2019, self.posts[-1].pub_date.year + 1)]
+        response = self.client.get(self.url)
+        self.assertEqual(
+            [choice["title"] for choice in response.context["choices"]],
+            years
+        )
+        response = self.client.get(self.url, {"pub_date__year": "2019"})
+        self.assertEqual(len(response.context["cl"].result_list), 1)
+
+    def test_search(self):
+        """Тестирование поиска постов в админке"""
+        Post.objects.create(text="Пост про собак", author=self.admin)
+        by_text = self.client.get(self.url, {"q": "собак"})
+        self.assertEqual(len(by_text.context["cl"].result_list), 1)
+        by_author = self.client.get(self.url, {"q": "@admin"})
+        self.assertEqual(
+            [post.author for post in by_author.context["cl"].result_list],
+            [self.admin]
+        )
+
+    def test_move_to_group(self):
+        """Тестирование переноса всех постов в другую группу"""
+        data = {"action": "move_to_group", "select_across": "1",
+                ACTION_CHECKBOX_NAME: [self.posts[0].pk]}
+        confirmation = self.client.post(self.url, data)
+        self.assertTemplateUsed(confirmation,
+                                "admin/posts/chunked_action.html")
+        self.assertEqual(Post.objects.filter(group=self.group).count(), 5)
+        response = self.client.post(
+            self.url, {**data, "apply": "yes", "group": self.new_group.pk}
+        )
+        self.assertRedirects(response, self.url)
+        self.assertEqual(Post.objects.filter(group=self.new_group).count(),
+                         5)
+        self.assertTrue(all(post.version == 2
+                            for post in Post.objects.all()))
+
+    def test_delete_in_chunks(self):
+        """Тестирование удаления выбранных постов порциями"""
+        selected = [post.pk for post in self.posts[:3]]
+        response = self.client.post(self.url, {
+            "action": "delete_in_chunks", "apply": "yes",
+            ACTION_CHECKBOX_NAME: selected,
+        })
+        self.assertRedirects(response, self.url)
+        self.assertFalse(Post.objects.filter(pk__in=selected).exists())
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(
+            AuthorStats.objects.get(user=self.author).posts_count, 2
+        )
+
+
+@override_settings(ADMIN_ACTION_CHUNK_SIZE=2)
+class CommentAdminTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="admin"
+        )
+        cls.author = User.objects.create_user(username="author")
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.admin)
+        self.post = Post.objects.create(text="Пост", author=self.author)
+        self.comments = [
+            Comment.objects.create(post=self.post, author=self.author,
+                                   text=f"Комментарий {number}")
+            for number in range(3)
+        ]
+
+    def test_delete_in_chunks_invalidates_post(self):
+        """Тестирование инвалидации поста при удалении комментариев"""
+        version = Post.objects.get(pk=self.post.pk).version
+        url = reverse("admin:posts_comment_changelist")
+        response = self.client.post(url, {
+            "action": "delete_in_chunks", "apply": "yes",
+            ACTION_CHECKBOX_NAME: [comment.pk for comment in self.comments],
+        })
+        self.assertRedirects(response, url)
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(Post.objects.get(pk=self.post.pk).version,
+                         version + 2)
+
+    def test_delete_invalidates_post(self):
+        """Тестирование инвалидации поста при удалении комментария"""
+        version = Post.objects.get(pk=self.post.pk).version
+        self.client.post(
+            reverse("admin:posts_comment_delete", args=(self.comments[0].pk,)),
+            {"post": "yes"}
+        )
+        self.assertEqual(Comment.objects.count(), 2)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).version,
+                         version + 1)
@@ -0,0 +1,197 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import (AuthorStats, Comment, Follow, Group, Post,
+                          TimelineEntry)
+
+User = get_user_model()
+
+
+class BenchCommandsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def seed(self):
+        call_command("seed_bench", users=20, groups=3, posts=60,
+                     comments=80, follows=40, stdout=StringIO())
+
+    def test_seed_bench_generates_skewed_data(self):
+        """Тестирование генерации данных seed_bench"""
+        self.seed()
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertEqual(Comment.objects.count(), 80)
+        self.assertEqual(Follow.objects.count(), 40)
+        self.assertEqual(AuthorStats.objects.count(), 20)
+        self.assertEqual(
+            sum(AuthorStats.objects.values_list("posts_count", flat=True)),
+            60
+        )
+        dates = set(Post.objects.values_list("pub_date", flat=True))
+        self.assertEqual(len(dates), 60)
+
+    def test_bench_views_writes_and_compares_results(self):
+        """Тестирование отчёта и сравнения с базовым отчётом bench_views"""
+        self.seed()
+        output = os.path.join(self.directory, "baseline.json")
+        call_command("bench_views", requests=3, warmup=1, output=output,
+                     stdout=StringIO())
+        with open(output) as results:
+            data = json.load(results)["results"]
+        self.assertEqual(set(data),
+                         {"index", "group", "profile", "post",
+                          "follow_index"})
+        for result in data.values():
+            self.assertLessEqual(result["p50"], result["p95"])
+            self.assertLessEqual(result["p95"], result["p99"])
+            self.assertGreater(result["queries"], 0)
+        out = StringIO()
+        call_command("bench_views", requests=3, warmup=1, baseline=output,
+                     stdout=out)
+        self.assertIn("vs baseline", out.getvalue())
+        for result in data.values():
+            result["p95"] = 1e-9
+        with open(output, "w") as results:
+            json.dump({"results": data}, results)
+        with self.assertRaises(CommandError):
+            call_command("bench_views", requests=3, warmup=1,
+                         baseline=output, max_regression=10,
+                         stdout=StringIO())
+
+    def test_bench_views_requires_data(self):
+        """Тестирование bench_views на пустой базе"""
+        with self.assertRaises(CommandError):
+            call_command("bench_views", requests=1, stdout=StringIO())
+
+
+class ContentCommandsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        # Deleting posts with images goes through the storage.
+        self.media = self.settings(MEDIA_ROOT=self.directory)
+        self.media.enable()
+        call_command("seed_bench", users=10, groups=2, posts=30,
+                     comments=40, follows=15, stdout=StringIO())
+        Post.objects.filter(pk=Post.objects.first().pk).update(
+            image="posts/ab/cd/abcd.jpg"
+        )
+
+    def tearDown(self):
+        self.media.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def snapshot(self):
+        return (
+            sorted(Group.objects.values_list("slug", "title")),
+            sorted(Post.objects.values_list("id", "text", "pub_date",
+                                            "author__username",
+                                            "group__slug", "image")),
+            sorted(Comment.objects.values_list("id", "post_id", "text",
+                                               "created")),
+            sorted(Follow.objects.values_list("user__username",
+                                              "author__username")),
+        )
+
+    def assertTimelinesComplete(self):
+        expected = {
+            (user, post)
+            for user, author in Follow.objects.values_list("user_id",
+                                                           "author_id")
+            for post in Post.objects.filter(author_id=author).values_list(
+                "pk", flat=True
+            )
+        }
+        self.assertEqual(
+            set(TimelineEntry.objects.values_list("user_id", "post_id")),
+            expected
+        )
+
+    def test_export_import_round_trip(self):
+        """Тестирование выгрузки и загрузки контента через NDJSON"""
+        path = os.path.join(self.directory, "content.ndjson.gz")
+        out = StringIO()
+        call_command("export_content", path, chunk_size=7, stdout=out)
+        self.assertIn("rows/s", out.getvalue())
+        expected = self.snapshot()
+        Follow.objects.all().delete()
+        Post.objects.all().delete()
+        Group.objects.all().delete()
+        User.objects.filter(username="bench_user_0").delete()
+        call_command("import_content", path, batch_size=4, keep_ids=True,
+                     stdout=StringIO())
+        self.assertEqual(self.snapshot(), expected)
+        self.assertEqual(
+            sum(AuthorStats.objects.values_list("posts_count", flat=True)),
+            30
+        )
+        self.assertTimelinesComplete()
+        out = StringIO()
+        with CaptureQueriesContext(connection) as context:
+            call_command("import_content", path, keep_ids=True, stdout=out)
+        self.assertEqual(self.snapshot(), expected)
+        self.assertIn("post: 0 rows, 30 skipped", out.getvalue())
+        # Nothing new was imported, so nothing is rebuilt.
+        self.assertFalse([
+            query for query in context.captured_queries
+            if query["sql"].startswith(("DELETE", "UPDATE"))
+        ])
+
+    def test_import_into_instance_with_content(self):
+        """Тестирование загрузки в базу с собственным контентом"""
+        path = os.path.join(self.directory, "content.ndjson")
+        call_command("export_content", path, stdout=StringIO())
+        source = Post.objects.annotate(
+            comments_total=Count("comments")
+        ).filter(comments_total__gt=0).order_by("pk").first()
+        comments = sorted(source.comments.values_list("author__username",
+                                                      "text"))
+        Follow.objects.all().delete()
+        Post.objects.all().delete()
+        local = User.objects.create_user(username="local")
+        Post.objects.create(id=source.pk, text="local post", author=local)
+        with self.assertRaises(CommandError):
+            call_command("import_content", path, keep_ids=True,
+                         stdout=StringIO())
+        Post.objects.exclude(author=local).delete()
+        call_command("import_content", path, stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 31)
+        self.assertFalse(Comment.objects.filter(post_id=source.pk).exists())
+        imported = Post.objects.exclude(author=local).get(
+            text=source.text, pub_date=source.pub_date
+        )
+        self.assertEqual(
+            sorted(imported.comments.values_list("author__username",
+                                                 "text")),
+            comments
+        )
+        self.assertTimelinesComplete()
+        self.assertEqual(
+            AuthorStats.objects.get(user=imported.author).posts_count,
+            imported.author.posts.count()
+        )
+
+    def test_import_rejects_broken_records(self):
+        """Тестирование загрузки повреждённого файла"""
+        path = os.path.join(self.directory, "broken.ndjson")
+        with open(path, "w") as stream:
+            stream.write('{"model": "post", "id": 1}\n')
+        with self.assertRaises(CommandError):
+            call_command("import_content", path, stdout=StringIO())
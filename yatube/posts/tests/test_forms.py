@@ -1,5 +1,7 @@
+import hashlib
 import shutil
 import tempfile
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -7,6 +9,8 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase
 from django.urls import reverse
 
+from core import sqlite
+from core.storage import ContentAddressedStorage
 from posts.models import Group, Post
 
 User = get_user_model()
@@ -67,7 +71,28 @@ class PostFormTest(TestCase):
         self.assertEqual(first_query_set.text, post_data["text"])
         self.assertEqual(first_query_set.group, PostFormTest.group)
         self.assertEqual(first_query_set.author, PostFormTest.user)
-        self.assertEqual(first_query_set.image.name, 'posts/small.gif')
+        digest = hashlib.sha256(self.small_gif).hexdigest()
+        self.assertEqual(first_query_set.image.name,
+                         f'posts/{digest[:2]}/{digest[2:4]}/{digest}.gif')
+
+    def test_image_is_stored_outside_write_transaction(self):
+        """Тестирование записи изображения вне транзакции записи"""
+        locked = []
+        save = ContentAddressedStorage._save
+
+        def record(storage, name, content):
+            locked.append(getattr(sqlite._local, "immediate", False))
+            return save(storage, name, content)
+
+        with mock.patch.object(ContentAddressedStorage, "_save", record):
+            self.authorized_client.post(reverse("new_post"), data={
+                "text": "test text",
+                "image": SimpleUploadedFile(name="small.gif",
+                                            content=self.small_gif,
+                                            content_type="image/gif"),
+            })
+        self.assertEqual(locked, [False])
+        self.assertTrue(Post.objects.filter(text="test text").exists())
 
     def test_post_edit_saving_changes(self):
         """Тестирование формы редактирования поста"""
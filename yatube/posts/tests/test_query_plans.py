@@ -0,0 +1,112 @@
+import re
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+FULL_SCAN = re.compile(r"\bSCAN (TABLE )?(?P<table>posts_\w+)\b(?! USING)")
+TEMP_SORT = "USE TEMP B-TREE FOR"
+
+
+def query_plan(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return [row[-1] for row in cursor.fetchall()]
+
+
+@override_settings(TIMELINE_FANOUT_ASYNC=False)
+class QueryPlanTest(TestCase):
+    """Every feed query must be an index range read, not scan + sort."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="reader")
+        cls.author = User.objects.create_user(username="author")
+        cls.group = Group.objects.create(
+            title="тест группа",
+            slug="test",
+            description="тестовое описание"
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for _ in range(12):
+            cls.post = Post.objects.create(text="test text",
+                                           author=cls.author,
+                                           group=cls.group)
+            Comment.objects.create(post=cls.post, author=cls.user,
+                                   text="comment")
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def captured_selects(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.authorized_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [query["sql"] for query in context.captured_queries
+                if query["sql"].startswith("SELECT")
+                and "posts_" in query["sql"]]
+
+    def assertIndexedPlans(self, url, allow_sort=False):
+        for sql in self.captured_selects(url):
+            plan = query_plan(sql)
+            scans = [line for line in plan if FULL_SCAN.search(line)]
+            sorts = [line for line in plan if TEMP_SORT in line]
+            self.assertFalse(
+                scans and sorts,
+                f"{url} runs a full scan plus a sort:\n{sql}\n"
+                + "\n".join(plan)
+            )
+            if not allow_sort:
+                self.assertFalse(
+                    sorts,
+                    f"{url} sorts in a temp B-tree:\n{sql}\n" + "\n".join(plan)
+                )
+
+    def test_full_scan_pattern(self):
+        """Тестирование распознавания полного просмотра таблицы"""
+        for line in ("SCAN posts_post", "SCAN TABLE posts_post"):
+            with self.subTest(line=line):
+                self.assertTrue(FULL_SCAN.search(line))
+        for line in ("SCAN posts_post USING INDEX post_pub_date_idx",
+                     "SCAN TABLE posts_post USING COVERING INDEX "
+                     "post_pub_date_idx",
+                     "SEARCH posts_post USING INTEGER PRIMARY KEY (rowid=?)"):
+            with self.subTest(line=line):
+                self.assertFalse(FULL_SCAN.search(line))
+
+    def test_feed_queries_use_indexes(self):
+        """Тестирование планов запросов лент и страницы поста"""
+        first_page = self.authorized_client.get(reverse("index"))
+        cursor = first_page.context["page"].next_cursor
+        urls = (
+            reverse("index"),
+            reverse("index") + f"?after={cursor}",
+            reverse("index") + f"?before={cursor}",
+            reverse("group", kwargs={"slug": self.group.slug}),
+            reverse("profile", kwargs={"username": self.author.username}),
+            reverse("post", kwargs={"username": self.author.username,
+                                    "post_id": self.post.id}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertIndexedPlans(url)
+
+    def test_follow_feed_queries_use_indexes(self):
+        """Тестирование планов запросов ленты подписок"""
+        for engine in ("join", "timeline", "pull"):
+            with self.subTest(engine=engine), \
+                    override_settings(FOLLOW_FEED_ENGINE=engine):
+                # Merging several authors in SQL always needs a sort; that
+                # is what the timeline and pull engines exist to avoid.
+                self.assertIndexedPlans(reverse("follow_index"),
+                                        allow_sort=engine == "join")
@@ -0,0 +1,91 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Post
+
+User = get_user_model()
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="author")
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def search(self, query, **params):
+        response = self.guest_client.get(reverse("search"),
+                                         {"q": query, **params})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def found(self, query):
+        return [post.id for post in self.search(query).context["page"]]
+
+    def test_triggers_keep_index_in_sync(self):
+        """Тестирование триггеров полнотекстового индекса"""
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'trigger' "
+                "AND tbl_name = 'posts_post'"
+            )
+            triggers = {row[0] for row in cursor.fetchall()}
+        self.assertEqual(triggers, {"posts_post_fts_insert",
+                                    "posts_post_fts_delete",
+                                    "posts_post_fts_update"})
+        post = Post.objects.create(text="Первый снег выпал", author=self.user)
+        Post.objects.bulk_create([Post(text="Снег и ветер",
+                                       author=self.user)])
+        self.assertEqual(len(self.found("снег")), 2)
+        post.text = "Дождь весь день"
+        post.save()
+        self.assertEqual(self.found("дождь"), [post.id])
+        self.assertEqual(len(self.found("снег")), 1)
+        post.delete()
+        self.assertEqual(self.found("дождь"), [])
+
+    def test_results_are_ranked_and_highlighted(self):
+        """Тестирование ранжирования и подсветки результатов"""
+        Post.objects.create(
+            text="кофе " + "и прочие напитки " * 20, author=self.user
+        )
+        best = Post.objects.create(text="кофе, снова кофе <b>и</b> кофе",
+                                   author=self.user)
+        response = self.search("кофе")
+        page = response.context["page"]
+        self.assertEqual(page[0].id, best.id)
+        self.assertIn("<mark>кофе</mark>", page[0].snippet)
+        self.assertContains(response, "&lt;b&gt;")
+        self.assertNotContains(response, "<b>и</b>")
+
+    def test_last_word_matches_as_prefix(self):
+        """Тестирование поиска по началу последнего слова"""
+        post = Post.objects.create(text="Программирование на Python",
+                                   author=self.user)
+        self.assertEqual(self.found("програм"), [post.id])
+        self.assertEqual(self.found('"* OR ('), [])
+        self.assertEqual(self.found(""), [])
+
+    def test_cursor_pages_cover_all_results(self):
+        """Тестирование курсорной пагинации результатов поиска"""
+        Post.objects.bulk_create(
+            Post(text=f"заметка номер {i}", author=self.user)
+            for i in range(25)
+        )
+        seen, params = [], {}
+        while True:
+            page = self.search("заметка", **params).context["page"]
+            seen.extend(post.id for post in page)
+            if not page.next_cursor:
+                break
+            params = {"after": page.next_cursor}
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+        previous = self.search(
+            "заметка", before=page.previous_cursor
+        ).context["page"]
+        self.assertEqual([post.id for post in previous], seen[10:20])
@@ -1,15 +1,33 @@
+import os
 import shutil
 import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import (Client, RequestFactory, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
 
-from posts.models import Follow, Group, Post
+from core import instrumentation
+from posts import page_cache, recent_posts, thumbnails, timeline
+from posts.cards import card_cache_stats, reset_card_cache_stats
+from posts.models import (AuthorStats, Comment, Follow, Group, Post,
+                          ReleasedImage, TimelineEntry)
 
 User = get_user_model()
 
@@ -184,6 +202,7 @@ class PaginatorViewsTest(TestCase):
 
     def setUp(self):
         self.client = Client()
+        cache.clear()
 
     def test_first_page_contains_ten_records(self):
         """Тестирование первой страницы паджинитора homepage"""
@@ -195,6 +214,41 @@ class PaginatorViewsTest(TestCase):
         response = self.client.get(reverse("index") + "?page=2")
         self.assertEqual(len(response.context["page"]), 5)
 
+    def test_cursor_pages_cover_all_records(self):
+        """Тестирование курсорной навигации паджинатора homepage"""
+        response = self.client.get(reverse("index"))
+        first_page = response.context["page"]
+        self.assertIsNone(first_page.previous_cursor)
+        response = self.client.get(
+            reverse("index") + f"?after={first_page.next_cursor}"
+        )
+        second_page = response.context["page"]
+        self.assertEqual(len(second_page), 5)
+        self.assertIsNone(second_page.next_cursor)
+        seen = {post.id for post in first_page} | {
+            post.id for post in second_page}
+        self.assertEqual(len(seen), 15)
+        response = self.client.get(
+            reverse("index") + f"?before={second_page.previous_cursor}"
+        )
+        self.assertEqual(list(response.context["page"]), list(first_page))
+        self.assertIsNone(response.context["page"].previous_cursor)
+
+    def test_cursor_page_does_not_count(self):
+        """Тестирование отсутствия COUNT(*) при курсорной навигации"""
+        response = self.client.get(reverse("index"))
+        cursor = response.context["page"].next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("index") + f"?after={cursor}")
+        for query in queries.captured_queries:
+            self.assertNotIn("__count", query["sql"])
+            self.assertNotIn("OFFSET", query["sql"])
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        """Тестирование некорректного курсора"""
+        response = self.client.get(reverse("index") + "?after=broken")
+        self.assertEqual(len(response.context["page"]), 10)
+
     def test_group_page_contains_ten_records(self):
         """Тестирование первой страницы паджинатора grouppage"""
         response = self.client.get(
@@ -267,3 +321,950 @@ class FollowTest(TestCase):
         response = self.authorized_client.get(reverse("follow_index"))
         posts_after_follow = len(response.context["page"])
         self.assertEqual(posts_after_follow, 1)
+
+
+@override_settings(TIMELINE_FANOUT_ASYNC=False)
+class FeedQueriesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="reader")
+        cls.author = User.objects.create_user(username="author")
+        cls.commentator = User.objects.create_user(username="commentator")
+        cls.group = Group.objects.create(
+            title="тест группа",
+            slug="test",
+            description="тестовое описание"
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        cls.urls = (
+            reverse("index"),
+            reverse("group", kwargs={"slug": cls.group.slug}),
+            reverse("profile", kwargs={"username": cls.author.username}),
+            reverse("follow_index"),
+        )
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create_posts(self, count):
+        for _ in range(count):
+            post = Post.objects.create(
+                text="test text",
+                author=self.author,
+                group=self.group
+            )
+            Comment.objects.create(
+                post=post, author=self.commentator, text="comment"
+            )
+
+    def count_queries(self):
+        queries = {}
+        for url in self.urls:
+            cache.clear()
+            with CaptureQueriesContext(connection) as context:
+                self.authorized_client.get(url)
+            queries[url] = len(context.captured_queries)
+        return queries
+
+    def test_feed_query_count_does_not_depend_on_page_size(self):
+        """Тестирование постоянного числа запросов в лентах"""
+        self.create_posts(1)
+        one_post = self.count_queries()
+        self.create_posts(9)
+        full_page = self.count_queries()
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertEqual(full_page[url], one_post[url])
+
+    def test_feed_shows_comments_count(self):
+        """Тестирование вывода числа комментариев в ленте"""
+        self.create_posts(1)
+        cache.clear()
+        response = self.authorized_client.get(reverse("index"))
+        self.assertEqual(
+            response.context["page"].object_list[0].comments_count, 1
+        )
+        self.assertContains(response, "Комментариев: 1")
+
+
+@override_settings(TIMELINE_FANOUT_ASYNC=False)
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="user")
+        cls.author = User.objects.create_user(username="author")
+        cls.other = User.objects.create_user(username="other")
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        """Тестирование записи нового поста в ленты подписчиков"""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text="test text", author=self.author)
+        Post.objects.create(text="other text", author=self.other)
+        self.assertEqual(
+            list(self.user.timeline.values_list("post_id", flat=True)),
+            [post.id]
+        )
+        response = self.authorized_client.get(reverse("follow_index"))
+        self.assertEqual(list(response.context["page"]), [post])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Тестирование заполнения и очистки ленты при подписке"""
+        posts = [Post.objects.create(text="test text", author=self.author)
+                 for _ in range(3)]
+        self.authorized_client.get(
+            reverse("profile_follow",
+                    kwargs={"username": self.author.username})
+        )
+        response = self.authorized_client.get(reverse("follow_index"))
+        self.assertEqual(list(response.context["page"]), posts[::-1])
+        self.authorized_client.get(
+            reverse("profile_unfollow",
+                    kwargs={"username": self.author.username})
+        )
+        self.assertFalse(self.user.timeline.exists())
+
+    def test_tasks_running_after_unfollow_add_nothing(self):
+        """Тестирование задач ленты, выполненных после отписки"""
+        post = Post.objects.create(text="test text", author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        Follow.objects.filter(user=self.user, author=self.author).delete()
+        timeline.backfill(self.user.pk, self.author.pk)
+        timeline.fan_out(post.pk)
+        self.assertFalse(self.user.timeline.exists())
+
+    def test_rebuild_timelines_command(self):
+        """Тестирование команды rebuild_timelines"""
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text="test text", author=self.author)
+        TimelineEntry.objects.all().delete()
+        call_command("rebuild_timelines", stdout=StringIO())
+        self.assertEqual(
+            list(self.user.timeline.values_list("post_id", flat=True)),
+            [post.id]
+        )
+
+
+class TimelineMigrationTest(TransactionTestCase):
+    def test_migration_backfills_existing_follows(self):
+        """Тестирование заполнения лент миграцией"""
+        user = User.objects.create_user(username="user")
+        author = User.objects.create_user(username="author")
+        Follow.objects.create(user=user, author=author)
+        post = Post.objects.create(text="test text", author=author)
+        TimelineEntry.objects.all().delete()
+        executor = MigrationExecutor(connection)
+        executor.migrate([("posts", "0019_post_search_index")])
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        self.assertEqual(
+            list(user.timeline.values_list("post_id", flat=True)),
+            [post.id]
+        )
+
+
+class AuthorStatsMigrationTest(TransactionTestCase):
+    def test_migration_fills_missing_stats(self):
+        """Тестирование создания счётчиков миграцией"""
+        user = User.objects.create_user(username="user")
+        author = User.objects.create_user(username="author")
+        Follow.objects.create(user=user, author=author)
+        Post.objects.create(text="test text", author=author)
+        AuthorStats.objects.all().delete()
+        executor = MigrationExecutor(connection)
+        executor.migrate([("posts", "0021_releasedimage")])
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+        self.assertEqual(
+            sorted(AuthorStats.objects.values_list(
+                "user__username", "posts_count", "followers_count",
+                "following_count"
+            )),
+            [("author", 1, 1, 0), ("user", 0, 0, 1)]
+        )
+
+
+@override_settings(FOLLOW_FEED_ENGINE="pull", RECENT_POSTS_LIMIT=5)
+class PullFeedTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="user")
+        cls.authors = [User.objects.create_user(username=f"author{i}")
+                       for i in range(3)]
+        for author in cls.authors:
+            Follow.objects.create(user=cls.user, author=author)
+        cls.stranger = User.objects.create_user(username="stranger")
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def walk_feed(self):
+        ids, params = [], ""
+        while True:
+            response = self.authorized_client.get(
+                reverse("follow_index") + params
+            )
+            page = response.context["page"]
+            ids.extend(post.id for post in page)
+            if not page.next_cursor:
+                return ids, page
+            params = f"?after={page.next_cursor}"
+
+    def test_pull_feed_matches_join_query(self):
+        """Тестирование совпадения pull-ленты с join-запросом"""
+        for i in range(24):
+            Post.objects.create(text="test text",
+                                author=self.authors[i % 3])
+        Post.objects.create(text="test text", author=self.stranger)
+        expected = list(Post.objects.filter(
+            author__following__user=self.user
+        ).order_by("-pub_date", "-id").values_list("id", flat=True))
+        ids, last_page = self.walk_feed()
+        self.assertEqual(ids, expected)
+        response = self.authorized_client.get(
+            reverse("follow_index") + f"?before={last_page.previous_cursor}"
+        )
+        self.assertEqual([post.id for post in response.context["page"]],
+                         expected[10:20])
+
+    def test_new_post_invalidates_cached_list(self):
+        """Тестирование обновления кэша последних постов автора"""
+        Post.objects.create(text="old text", author=self.authors[0])
+        self.walk_feed()
+        post = Post.objects.create(text="new text", author=self.authors[0])
+        ids, _ = self.walk_feed()
+        self.assertEqual(ids[0], post.id)
+
+    def test_list_loaded_before_commit_is_not_served(self):
+        """Тестирование устаревшего списка, сохранённого после записи"""
+        author = self.authors[0]
+        Post.objects.create(text="old text", author=author)
+        version = recent_posts._versions([author.id])[author.id]
+        stale = recent_posts._load(author.id)
+        post = Post.objects.create(text="new text", author=author)
+        # A reader that loaded the list before the post was committed
+        # stores it after the commit.
+        cache.set(recent_posts.LIST_KEY.format(author.id, version), stale)
+        lists = recent_posts.recent_posts([author.id])
+        self.assertEqual(lists[author.id][0][1], post.id)
+
+    @override_settings(FOLLOW_FEED_ENGINE="timeline")
+    def test_bench_follow_feed_command(self):
+        """Тестирование команды bench_follow_feed"""
+        Post.objects.create(text="test text", author=self.authors[0])
+        call_command("rebuild_timelines", stdout=StringIO())
+        out = StringIO()
+        call_command("bench_follow_feed", iterations=2, stdout=out,
+                     stderr=out)
+        for engine in ("join", "timeline", "pull"):
+            self.assertIn(engine, out.getvalue())
+        self.assertNotIn("differ", out.getvalue())
+
+
+class AuthorStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="user")
+        cls.author = User.objects.create_user(username="author")
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def assertStats(self, user, posts, followers, following):
+        stats = AuthorStats.objects.get(user=user)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count, stats.following_count),
+            (posts, followers, following)
+        )
+
+    def test_stats_follow_posts_and_follows(self):
+        """Тестирование обновления счётчиков автора"""
+        post = Post.objects.create(text="test text", author=self.author)
+        Post.objects.create(text="test text", author=self.author)
+        self.authorized_client.get(
+            reverse("profile_follow",
+                    kwargs={"username": self.author.username})
+        )
+        self.assertStats(self.author, 2, 1, 0)
+        self.assertStats(self.user, 0, 0, 1)
+        post.delete()
+        self.authorized_client.get(
+            reverse("profile_unfollow",
+                    kwargs={"username": self.author.username})
+        )
+        self.assertStats(self.author, 1, 0, 0)
+        self.assertStats(self.user, 0, 0, 0)
+
+    def test_profile_shows_stats(self):
+        """Тестирование вывода счётчиков на странице профиля"""
+        Post.objects.create(text="test text", author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        response = self.authorized_client.get(
+            reverse("profile", kwargs={"username": self.author.username})
+        )
+        self.assertContains(response, "Подписчиков: 1")
+        self.assertContains(response, "Записей: 1")
+
+    def test_missing_stats_row_is_built_on_read(self):
+        """Тестирование создания отсутствующей строки счётчиков"""
+        Post.objects.create(text="test text", author=self.author)
+        AuthorStats.objects.filter(user=self.author).delete()
+        response = self.authorized_client.get(
+            reverse("profile", kwargs={"username": self.author.username})
+        )
+        self.assertEqual(response.context["stats"].posts_count, 1)
+        self.assertStats(self.author, 1, 0, 0)
+
+    def test_author_header_in_one_query(self):
+        """Тестирование шапки автора одним запросом"""
+        post = Post.objects.create(text="test text", author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        urls = (
+            reverse("profile", kwargs={"username": self.author.username}),
+            reverse("post", kwargs={"username": self.author.username,
+                                    "post_id": post.id}),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                # Session, user, author with header, posts or comments.
+                with self.assertNumQueries(4):
+                    response = self.authorized_client.get(url)
+                self.assertTrue(response.context["following"])
+                self.assertContains(response, "Отписаться")
+                self.assertContains(response, "Подписчиков: 1")
+                self.assertContains(response, "Записей: 1")
+
+    def test_repair_author_stats_command(self):
+        """Тестирование команды repair_author_stats"""
+        Post.objects.create(text="test text", author=self.author)
+        Follow.objects.create(user=self.user, author=self.author)
+        AuthorStats.objects.filter(user=self.author).update(
+            posts_count=7, followers_count=0
+        )
+        AuthorStats.objects.filter(user=self.user).delete()
+        call_command("repair_author_stats", "--dry-run", stdout=StringIO())
+        self.assertStats(self.author, 7, 0, 0)
+        out = StringIO()
+        call_command("repair_author_stats", stdout=out)
+        self.assertIn("Repaired 1 drifted and 1 missing", out.getvalue())
+        self.assertStats(self.author, 1, 1, 0)
+        self.assertStats(self.user, 0, 0, 1)
+
+
+class PostCardCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="тест группа",
+            slug="test",
+            description="тестовое описание"
+        )
+
+    def setUp(self):
+        cache.clear()
+        reset_card_cache_stats()
+        self.post = Post.objects.create(text="test text", author=self.author,
+                                        group=self.group)
+        self.guest_client = Client()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_card_is_reused_across_feeds(self):
+        """Тестирование повторного использования карточки поста"""
+        self.guest_client.get(reverse("index"))
+        self.guest_client.get(
+            reverse("profile", kwargs={"username": self.author.username})
+        )
+        self.guest_client.get(
+            reverse("group", kwargs={"slug": self.group.slug})
+        )
+        self.assertEqual(card_cache_stats(),
+                         {"hits": 2, "misses": 1, "ratio": 2 / 3})
+        out = StringIO()
+        call_command("post_card_stats", "--reset", stdout=out)
+        self.assertIn("hit ratio 66.7%", out.getvalue())
+        self.assertEqual(card_cache_stats()["hits"], 0)
+
+    @override_settings(POST_CARD_STATS_FLUSH_INTERVAL=3600)
+    def test_page_of_cards_is_read_at_once(self):
+        """Тестирование чтения всех карточек страницы одним запросом"""
+        for _ in range(4):
+            Post.objects.create(text="test text", author=self.author)
+        url = reverse("follow_index")
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.reader_client.get(url)
+        with mock.patch.object(cache, "get_many",
+                               wraps=cache.get_many) as get_many, \
+                mock.patch.object(cache, "incr",
+                                  wraps=cache.incr) as incr:
+            response = self.reader_client.get(url)
+        self.assertEqual(len(response.context["page"]), 5)
+        card_reads = [call for call in get_many.call_args_list
+                      if "post_card:" in str(call)]
+        self.assertEqual(len(card_reads), 1)
+        incr.assert_not_called()
+        self.assertEqual(card_cache_stats()["hits"], 5)
+
+    def test_card_varies_for_author(self):
+        """Тестирование отдельной карточки для автора поста"""
+        url = reverse("profile", kwargs={"username": self.author.username})
+        self.guest_client.get(url)
+        response = self.author_client.get(url)
+        self.assertContains(response, "Редактировать")
+
+    def test_card_is_invalidated_by_changes(self):
+        """Тестирование инвалидации карточки при изменениях"""
+        url = reverse("profile", kwargs={"username": self.author.username})
+        self.guest_client.get(url)
+        self.author_client.post(
+            reverse("post_edit", kwargs={"username": self.author.username,
+                                         "post_id": self.post.id}),
+            data={"text": "edited text", "group": self.group.id}
+        )
+        self.assertContains(self.guest_client.get(url), "edited text")
+        Comment.objects.create(post=self.post, author=self.author,
+                               text="comment")
+        self.assertContains(self.guest_client.get(url), "Комментариев: 1")
+        self.group.title = "новое название"
+        self.group.save()
+        self.assertContains(self.guest_client.get(url), "#новое название")
+
+    def test_comments_are_deleted_with_post_at_once(self):
+        """Тестирование удаления комментариев вместе с постом"""
+        def delete_post(comments):
+            post = Post.objects.create(text="test text", author=self.author,
+                                       group=self.group)
+            Comment.objects.bulk_create(
+                Comment(post=post, author=self.reader, text="comment")
+                for _ in range(comments)
+            )
+            with CaptureQueriesContext(connection) as context:
+                post.delete()
+            self.assertFalse(Comment.objects.filter(post=post).exists())
+            return len(context.captured_queries)
+
+        self.assertEqual(delete_post(1), delete_post(20))
+
+
+class PageCacheTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.group = Group.objects.create(
+            title="тест группа",
+            slug="test",
+            description="тестовое описание"
+        )
+
+    def setUp(self):
+        cache.clear()
+        reset_card_cache_stats()
+        self.post = Post.objects.create(text="test text", author=self.author,
+                                        group=self.group)
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.urls = (
+            reverse("index"),
+            reverse("group", kwargs={"slug": self.group.slug}),
+            reverse("profile", kwargs={"username": self.author.username}),
+        )
+
+    def assertCached(self, url, client=None):
+        response = (client or self.guest_client).get(url)
+        self.assertIsNone(response.context)
+        return response
+
+    def assertFresh(self, url, client=None):
+        response = (client or self.guest_client).get(url)
+        self.assertIsNotNone(response.context)
+        return response
+
+    def test_pages_are_cached_until_write(self):
+        """Тестирование кэширования страниц до изменения данных"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertFresh(url)
+                self.assertCached(url)
+        Post.objects.create(text="new text", author=self.author,
+                            group=self.group)
+        for url in self.urls:
+            with self.subTest(url=url):
+                self.assertContains(self.assertFresh(url), "new text")
+
+    def test_comment_and_edit_invalidate_pages(self):
+        """Тестирование инвалидации кэша комментарием и правкой"""
+        url = reverse("index")
+        self.assertFresh(url)
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text="comment")
+        self.assertContains(self.assertFresh(url), "Комментариев: 1")
+        self.post.group = None
+        self.post.save()
+        response = self.assertFresh(
+            reverse("group", kwargs={"slug": self.group.slug})
+        )
+        self.assertEqual(len(response.context["page"]), 0)
+
+    def test_comment_reads_post_scopes_once(self):
+        """Тестирование числа запросов при инвалидации комментарием"""
+        comment = Comment(post=Post.objects.get(pk=self.post.pk),
+                          author=self.reader, text="comment")
+        with CaptureQueriesContext(connection) as context:
+            comment.save()
+        selects = [query["sql"] for query in context.captured_queries
+                   if query["sql"].startswith("SELECT")]
+        self.assertEqual(len(selects), 1)
+
+    def test_unrelated_write_keeps_cache(self):
+        """Тестирование сохранения кэша при посторонних изменениях"""
+        url = reverse("group", kwargs={"slug": self.group.slug})
+        self.assertFresh(url)
+        Post.objects.create(text="new text", author=self.reader)
+        self.assertCached(url)
+
+    def test_pages_vary_on_viewer_and_follow(self):
+        """Тестирование кэша профиля для разных пользователей"""
+        url = reverse("profile", kwargs={"username": self.author.username})
+        self.assertFresh(url)
+        self.assertFresh(url, self.reader_client)
+        self.assertCached(url, self.reader_client)
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.assertFresh(url, self.reader_client)
+        self.assertTrue(response.context["following"])
+
+
+class StaleWhileRevalidateTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+
+    def setUp(self):
+        cache.clear()
+        Post.objects.create(text="old text", author=self.author)
+        self.guest_client = Client()
+        request = RequestFactory().get(reverse("index"))
+        request.user = AnonymousUser()
+        self.lock = page_cache.LOCK_KEY.format(
+            page_cache.page_cache_key(request, "index", "index")
+        )
+
+    def test_stale_page_is_served_while_other_worker_rebuilds(self):
+        """Тестирование выдачи устаревшей страницы во время пересборки"""
+        self.guest_client.get(reverse("index"))
+        Post.objects.create(text="new text", author=self.author)
+        cache.add(self.lock, 1)
+        response = self.guest_client.get(reverse("index"))
+        self.assertIsNone(response.context)
+        self.assertNotContains(response, "new text")
+        cache.delete(self.lock)
+        response = self.guest_client.get(reverse("index"))
+        self.assertContains(response, "new text")
+        self.assertIsNone(cache.get(self.lock))
+
+    def test_waiting_stops_when_lock_is_released(self):
+        """Тестирование ожидания страницы, которая не попала в кэш"""
+        request = RequestFactory().get("/nobody-here/")
+        request.user = AnonymousUser()
+        lock = page_cache.LOCK_KEY.format(page_cache.page_cache_key(
+            request, "profile", "profile:nobody-here"
+        ))
+        cache.add(lock, 1)
+        timer = threading.Timer(0.2, cache.delete, (lock,))
+        timer.start()
+        started = time.monotonic()
+        response = self.guest_client.get("/nobody-here/")
+        timer.join()
+        self.assertEqual(response.status_code, 404)
+        self.assertLess(time.monotonic() - started,
+                        settings.PAGE_CACHE_LOCK_TIMEOUT / 2)
+
+    def test_page_is_refreshed_early_near_expiry(self):
+        """Тестирование вероятностного раннего обновления"""
+        self.guest_client.get(reverse("index"))
+        with mock.patch("posts.page_cache.random.random",
+                        return_value=1.0):
+            self.assertIsNone(
+                self.guest_client.get(reverse("index")).context
+            )
+        with override_settings(PAGE_CACHE_EARLY_REFRESH_BETA=10 ** 9), \
+                mock.patch("posts.page_cache.random.random",
+                           return_value=1e-12):
+            self.assertIsNotNone(
+                self.guest_client.get(reverse("index")).context
+            )
+
+
+@mock.patch("posts.views.COMMENTS_PER_PAGE", 3)
+class CommentsPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.post = Post.objects.create(text="viral post", author=cls.author)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.reader, text=f"comment {i}")
+            for i in range(7)
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.kwargs = {"username": self.author.username,
+                       "post_id": self.post.pk}
+
+    def texts(self, page):
+        return [comment.text for comment in page]
+
+    def test_comments_are_loaded_in_batches(self):
+        """Тестирование постраничной подгрузки комментариев"""
+        response = self.guest_client.get(reverse("post", kwargs=self.kwargs))
+        page = response.context["comments"]
+        self.assertEqual(self.texts(page),
+                         ["comment 0", "comment 1", "comment 2"])
+        loaded = []
+        url = reverse("post_comments", kwargs=self.kwargs)
+        cursor = page.next_cursor
+        while cursor:
+            response = self.guest_client.get(url, {"after": cursor})
+            self.assertTemplateNotUsed(response, "base.html")
+            loaded += self.texts(response.context["page"])
+            cursor = response.context["page"].next_cursor
+        self.assertEqual(loaded, [f"comment {i}" for i in range(3, 7)])
+
+    def test_fragment_of_missing_post(self):
+        """Тестирование подгрузки комментариев несуществующего поста"""
+        response = self.guest_client.get(reverse("post_comments", kwargs={
+            "username": self.reader.username, "post_id": self.post.pk
+        }))
+        self.assertEqual(response.status_code, 404)
+
+    def test_new_comment_is_shown_after_redirect(self):
+        """Тестирование показа нового комментария в длинной ветке"""
+        response = self.reader_client.post(
+            reverse("add_comment", kwargs=self.kwargs),
+            {"text": "my comment"}, follow=True
+        )
+        self.assertEqual(self.texts(response.context["comments"]),
+                         ["comment 5", "comment 6", "my comment"])
+        self.assertIsNotNone(response.context["comments"].previous_cursor)
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username="author")
+        cls.reader = User.objects.create_user(username="reader")
+        cls.post = Post.objects.create(text="old text", author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.post_url = reverse("post", kwargs={
+            "username": self.author.username, "post_id": self.post.pk
+        })
+
+    def revalidate(self, url, response, client=None):
+        client = client or self.guest_client
+        return client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_unchanged_pages_are_not_sent_again(self):
+        """Тестирование ответа 304 для неизменившихся страниц"""
+        for url in (reverse("index"), self.post_url,
+                    reverse("profile",
+                            kwargs={"username": self.author.username})):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertIn("no-cache", response["Cache-Control"])
+                with self.assertNumQueries(0):
+                    again = self.revalidate(url, response)
+                self.assertEqual(again.status_code, 304)
+                self.assertEqual(again["ETag"], response["ETag"])
+
+    def test_writes_change_validators(self):
+        """Тестирование смены ETag после изменений на странице"""
+        index = self.guest_client.get(reverse("index"))
+        post = self.guest_client.get(self.post_url)
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text="new comment")
+        self.assertEqual(self.revalidate(reverse("index"), index)
+                         .status_code, 200)
+        response = self.revalidate(self.post_url, post)
+        self.assertContains(response, "new comment")
+
+    def test_validators_vary_on_viewer(self):
+        """Тестирование ETag для разных пользователей"""
+        for url in (reverse("index"), self.post_url):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertNotIn("Last-Modified", response)
+                self.assertEqual(
+                    self.revalidate(url, response,
+                                    self.reader_client).status_code, 200
+                )
+                # A date alone never revalidates another viewer's copy.
+                by_date = self.reader_client.get(
+                    url, HTTP_IF_MODIFIED_SINCE=http_date()
+                )
+                self.assertEqual(by_date.status_code, 200)
+
+
+@override_settings(REQUEST_INSTRUMENTATION=True, QUERY_BUDGET_STRICT=True)
+class QueryBudgetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username="reader")
+        cls.author = User.objects.create_user(username="author")
+        cls.group = Group.objects.create(
+            title="тест группа",
+            slug="test",
+            description="тестовое описание"
+        )
+        Follow.objects.create(user=cls.user, author=cls.author)
+        for _ in range(12):
+            cls.post = Post.objects.create(
+                text="test text",
+                author=cls.author,
+                group=cls.group
+            )
+            Comment.objects.create(post=cls.post, author=cls.user,
+                                   text="comment")
+        cls.urls = {
+            "index": reverse("index"),
+            "group": reverse("group", kwargs={"slug": cls.group.slug}),
+            "profile": reverse("profile",
+                               kwargs={"username": cls.author.username}),
+            "post": reverse("post",
+                            kwargs={"username": cls.author.username,
+                                    "post_id": cls.post.id}),
+            "post_comments": reverse("post_comments",
+                                     kwargs={"username": cls.author.username,
+                                             "post_id": cls.post.id}),
+            "follow_index": reverse("follow_index"),
+            "search": reverse("search") + "?q=test",
+        }
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        instrumentation.reset()
+
+    def test_views_stay_within_query_budget(self):
+        """Тестирование бюджета запросов view-функций на холодном кэше"""
+        for name, url in self.urls.items():
+            with self.subTest(url=url):
+                cache.clear()
+                response = self.authorized_client.get(url)
+                recorder = response.instrumentation
+                self.assertIsNotNone(recorder.budget)
+                self.assertLessEqual(recorder.queries, recorder.budget)
+                self.assertIn(f'desc="{recorder.queries} queries"',
+                              response["Server-Timing"])
+
+    def test_aggregate_by_url_name(self):
+        """Тестирование накопленной статистики по именам URL"""
+        cache.clear()
+        self.authorized_client.get(self.urls["index"])
+        self.authorized_client.get(self.urls["index"])
+        stats = instrumentation.aggregate()["index"]
+        self.assertEqual(stats["requests"], 2)
+        self.assertGreater(stats["queries"], 0)
+        self.assertGreater(stats["template_time"], 0)
+        self.assertGreater(stats["cache_hit_ratio"], 0)
+
+    def test_exceeded_budget_fails(self):
+        """Тестирование превышения бюджета запросов"""
+        cache.clear()
+        with mock.patch("posts.views.index.query_budget", 0):
+            with self.assertRaises(instrumentation.QueryBudgetExceeded):
+                self.authorized_client.get(self.urls["index"])
+
+
+class ThumbnailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.settings_override.enable()
+        cls.author = User.objects.create_user(username="author")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    small_gif = (
+        b'\x47\x49\x46\x38\x39\x61\x01\x00'
+        b'\x01\x00\x00\x00\x00\x21\xf9\x04'
+        b'\x01\x0a\x00\x01\x00\x2c\x00\x00'
+        b'\x00\x00\x01\x00\x01\x00\x00\x02'
+        b'\x02\x4c\x01\x00\x3b'
+    )
+    # The same pixel with another frame delay.
+    other_gif = small_gif.replace(b'\x0a\x00', b'\x0b\x00')
+
+    def create_post(self):
+        return Post.objects.create(
+            text="test text",
+            author=self.author,
+            image=SimpleUploadedFile(
+                name="small.gif",
+                content=self.small_gif,
+                content_type="image/gif"
+            )
+        )
+
+    def test_thumbnail_is_generated_on_upload(self):
+        """Тестирование создания миниатюры при загрузке картинки"""
+        post = self.create_post()
+        thumbnail = thumbnails.ready_thumbnail(post.image, "960x339")
+        self.assertIsNotNone(thumbnail)
+        response = self.guest_client.get(reverse("index"))
+        self.assertContains(response, thumbnail.url)
+
+    def test_card_has_responsive_webp_renditions(self):
+        """Тестирование srcset из WebP-миниатюр разной ширины"""
+        post = self.create_post()
+        response = self.guest_client.get(reverse("index"))
+        self.assertContains(response, 'loading="lazy"')
+        for width in settings.THUMBNAIL_SRCSET_WIDTHS:
+            with self.subTest(width=width):
+                rendition = post.rendition(f"960x339:{width}w")
+                self.assertEqual(rendition["width"], width)
+                self.assertTrue(rendition["name"].endswith(".webp"))
+                self.assertContains(response, f'{rendition["name"]} {width}w')
+
+    def test_card_shows_inline_placeholder(self):
+        """Тестирование встроенной заглушки и размеров картинки"""
+        post = self.create_post()
+        self.assertEqual((post.image_width, post.image_height), (1, 1))
+        self.assertTrue(
+            post.image_placeholder.startswith("data:image/jpeg;base64,")
+        )
+        response = self.guest_client.get(reverse("index"))
+        self.assertContains(response, post.image_placeholder)
+        self.assertContains(response, 'width="960" height="339"')
+
+    def test_original_is_shown_until_thumbnail_is_ready(self):
+        """Тестирование показа оригинала до создания миниатюры"""
+        with mock.patch("posts.thumbnails.schedule") as schedule:
+            post = self.create_post()
+        schedule.assert_called_once_with(post)
+        response = self.guest_client.get(reverse("index"))
+        self.assertContains(response, post.image.url)
+        thumbnails.pregenerate(post.pk)
+        thumbnail = thumbnails.ready_thumbnail(post.image, "960x339")
+        response = self.guest_client.get(reverse("index"))
+        self.assertContains(response, thumbnail.url)
+
+    def test_card_reads_stored_rendition(self):
+        """Тестирование вывода миниатюры без обращения к KV-хранилищу"""
+        post = self.create_post()
+        rendition = post.rendition("960x339")
+        self.assertEqual(post.image_hash,
+                         Post.objects.get(pk=post.pk).image_hash)
+        self.assertEqual((rendition["width"], rendition["height"]),
+                         (960, 339))
+        with mock.patch("sorl.thumbnail.kvstores.base.KVStoreBase.get",
+                        side_effect=AssertionError("KV store lookup")):
+            response = self.guest_client.get(reverse("index"))
+        self.assertContains(response, rendition["name"])
+        self.assertIsNone(thumbnails.pregenerate(post.pk))
+
+    def test_replaced_image_falls_back_to_original(self):
+        """Тестирование сброса миниатюры при замене картинки"""
+        post = self.create_post()
+        with mock.patch("posts.thumbnails.schedule"):
+            post.image = SimpleUploadedFile(
+                name="other.gif",
+                content=self.other_gif,
+                content_type="image/gif"
+            )
+            post.save()
+        self.assertIsNone(post.rendition("960x339"))
+        call_command("pregenerate_thumbnails", stdout=StringIO())
+        post.refresh_from_db()
+        self.assertIsNotNone(post.rendition("960x339"))
+
+    def test_same_image_is_stored_once(self):
+        """Тестирование дедупликации одинаковых картинок"""
+        first, second = self.create_post(), self.create_post()
+        self.assertEqual(first.image.name, second.image.name)
+        storage = first.image.storage
+        thumbnail = storage.path(first.rendition("960x339")["name"])
+        first.delete()
+        call_command("sweep_images", grace=0, stdout=StringIO())
+        self.assertTrue(storage.exists(second.image.name))
+        second.delete()
+        self.assertTrue(storage.exists(second.image.name))
+        call_command("sweep_images", grace=0, stdout=StringIO())
+        self.assertFalse(storage.exists(second.image.name))
+        self.assertFalse(os.path.exists(thumbnail))
+        self.assertFalse(ReleasedImage.objects.exists())
+
+    def test_reused_image_is_not_swept(self):
+        """Тестирование сохранения картинки, загруженной повторно"""
+        post = self.create_post()
+        name = post.image.name
+        path = post.image.storage.path(name)
+        post.delete()
+        ReleasedImage.objects.update(released=timezone.now()
+                                     - timedelta(hours=2))
+        os.utime(path, (0, 0))
+        # An identical upload whose post is not committed yet.
+        post.image.storage.save("posts/again.gif",
+                                SimpleUploadedFile("again.gif",
+                                                   self.small_gif))
+        self.assertEqual(thumbnails.sweep_images(grace=60), 0)
+        self.assertTrue(os.path.exists(path))
+        os.utime(path, (0, 0))
+        self.assertEqual(thumbnails.sweep_images(grace=60), 1)
+        self.assertFalse(os.path.exists(path))
+
+    def test_replaced_image_is_deleted(self):
+        """Тестирование удаления заменённой картинки"""
+        post = self.create_post()
+        old_name = post.image.name
+        post.image = SimpleUploadedFile(
+            name="other.gif",
+            content=self.other_gif,
+            content_type="image/gif"
+        )
+        post.save()
+        self.assertNotEqual(post.image.name, old_name)
+        call_command("sweep_images", grace=0, stdout=StringIO())
+        self.assertFalse(post.image.storage.exists(old_name))
+        self.assertTrue(post.image.storage.exists(post.image.name))
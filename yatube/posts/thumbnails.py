@@ -0,0 +1,267 @@
+import base64
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from io import BytesIO
+
+import django
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageFilter, ImageOps
+from sorl.thumbnail import default, delete
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.parsers import parse_geometry
+
+from . import cards, page_cache
+from .models import Post, ReleasedImage
+
+logger = logging.getLogger(__name__)
+
+_pool = None
+
+
+class PregeneratingBackend(ThumbnailBackend):
+    """sorl backend that can look a thumbnail up without creating it."""
+
+    def get_ready_thumbnail(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault("format", self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return default.kvstore.get(ImageFile(name, default.storage))
+
+
+backend = PregeneratingBackend()
+
+
+def srcset_key(geometry, width):
+    return f"{geometry}:{width}w"
+
+
+def renditions():
+    """Map every rendition key to its sorl geometry and options.
+
+    Each THUMBNAIL_GEOMETRIES entry is kept as is, in the upload format,
+    and is also encoded as THUMBNAIL_SRCSET_FORMAT at every width of
+    THUMBNAIL_SRCSET_WIDTHS with the same aspect ratio, for srcset.
+    """
+    specs = {}
+    for geometry, options in settings.THUMBNAIL_GEOMETRIES.items():
+        specs[geometry] = (geometry, options)
+        width, height = parse_geometry(geometry)
+        for srcset_width in settings.THUMBNAIL_SRCSET_WIDTHS:
+            srcset_geometry = str(srcset_width)
+            if height is not None:
+                srcset_geometry += f"x{round(height * srcset_width / width)}"
+            specs[srcset_key(geometry, srcset_width)] = (
+                srcset_geometry,
+                {**options, "format": settings.THUMBNAIL_SRCSET_FORMAT},
+            )
+    return specs
+
+
+def ready_thumbnail(image, key):
+    """The rendition ``key`` of ``image`` if it was generated, else None."""
+    geometry, options = renditions()[key]
+    return backend.get_ready_thumbnail(image, geometry, **options)
+
+
+def image_hash(image):
+    digest = hashlib.sha256()
+    with image.storage.open(image.name) as source:
+        for chunk in source.chunks():
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def placeholder(image):
+    """Intrinsic size and a tiny blurred JPEG data URI of ``image``."""
+    with image.storage.open(image.name) as source:
+        picture = Image.open(source)
+        picture = ImageOps.exif_transpose(picture)
+        size = picture.size
+        picture = picture.convert("RGB")
+        picture.thumbnail((settings.IMAGE_PLACEHOLDER_SIZE,) * 2)
+    output = BytesIO()
+    picture.filter(ImageFilter.GaussianBlur(1)).save(
+        output, "JPEG", quality=settings.IMAGE_PLACEHOLDER_QUALITY
+    )
+    encoded = base64.b64encode(output.getvalue()).decode()
+    return size, f"data:image/jpeg;base64,{encoded}"
+
+
+def _is_current(post):
+    stored = post.renditions
+    sizes = set(stored.get("sizes", ()))
+    return (stored.get("source") == post.image.name
+            and sizes >= set(renditions())
+            and bool(post.image_placeholder))
+
+
+def pregenerate(post_id, invalidate=True):
+    """Create every rendition of a post's image, see ``renditions()``.
+
+    Their names and sizes are stored on the post with a hash of the image,
+    its intrinsic size and a placeholder, so cards never ask sorl's
+    key-value store or the storage about them.
+    Cards and pages rendered with the fallback image are then invalidated.
+    Returns the updated Post fields, or None if there was nothing to do.
+    """
+    post = Post.objects.select_related("author", "group").filter(
+        pk=post_id
+    ).first()
+    if post is None or not post.image or _is_current(post):
+        return None
+    try:
+        digest = image_hash(post.image)
+        (width, height), data_uri = placeholder(post.image)
+    except (OSError, SuspiciousFileOperation):
+        logger.exception("Image %s of post %s is unreadable",
+                         post.image.name, post_id)
+        return None
+    sizes = {}
+    for key, (geometry, options) in renditions().items():
+        try:
+            thumbnail = (ready_thumbnail(post.image, key)
+                         or backend.get_thumbnail(post.image, geometry,
+                                                  **options))
+        except Exception:
+            logger.exception("Thumbnail %s of post %s failed", key,
+                             post_id)
+            continue
+        sizes[key] = {"name": thumbnail.name,
+                      "width": thumbnail.width,
+                      "height": thumbnail.height}
+    fields = {
+        "image_hash": digest,
+        "image_width": width,
+        "image_height": height,
+        "image_placeholder": data_uri,
+        "image_renditions": json.dumps({"source": post.image.name,
+                                        "sizes": sizes}),
+    }
+    Post.objects.filter(pk=post_id, image=post.image.name).update(**fields)
+    if invalidate:
+        cards.bump_versions(pk=post_id)
+        page_cache.invalidate_post(post)
+    return fields
+
+
+def release_image(name):
+    """Queue an image a post no longer uses for sweep_images.
+
+    Nothing is deleted right away: an identical upload may be reusing the
+    blob in a transaction that has not committed yet. The row is written
+    in the caller's transaction, so a rollback keeps the image.
+    """
+    ReleasedImage.objects.update_or_create(
+        name=name, defaults={"released": timezone.now()}
+    )
+
+
+def _sweep(name, storage, grace):
+    """Delete a released image and its thumbnails if nothing uses it.
+
+    Returns whether the image is settled, i.e. deleted or referenced.
+    """
+    if Post.objects.filter(image=name).exists():
+        return True
+    path = storage.path(name)
+    try:
+        if time.time() - os.stat(path).st_mtime < grace:
+            return False
+        # Move the blob aside first: an upload of the same content that
+        # touched it just before is seen below, and one that comes later
+        # finds no blob and writes it again.
+        released = f"{path}.released"
+        os.rename(path, released)
+    except FileNotFoundError:
+        released = None
+    if released is not None:
+        if (time.time() - os.stat(released).st_mtime < grace
+                or Post.objects.filter(image=name).exists()):
+            os.replace(released, path)
+            return False
+        os.remove(released)
+    delete(ImageFile(name, storage), delete_file=False)
+    return True
+
+
+def sweep_images(grace):
+    """Delete images released more than ``grace`` seconds ago that no
+    post refers to; returns how many were settled."""
+    storage = Post._meta.get_field("image").storage
+    cutoff = timezone.now() - timedelta(seconds=grace)
+    settled = 0
+    for name in ReleasedImage.objects.filter(
+            released__lte=cutoff).values_list("name", flat=True).iterator():
+        try:
+            if not _sweep(name, storage, grace):
+                continue
+        except (OSError, SuspiciousFileOperation):
+            logger.exception("Image %s could not be deleted", name)
+            continue
+        ReleasedImage.objects.filter(name=name, released__lte=cutoff).delete()
+        settled += 1
+    return settled
+
+
+def _run(post_id):
+    try:
+        pregenerate(post_id)
+    finally:
+        connections.close_all()
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # Spawned workers set Django up from scratch instead of inheriting
+        # the parent's database connections through fork(). The initializer
+        # must not import any models: it is unpickled before setup.
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.THUMBNAIL_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=django.setup,
+        )
+    return _pool
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error("Thumbnail pre-generation failed",
+                     exc_info=future.exception())
+
+
+def _submit(post_id):
+    _get_pool().submit(_run, post_id).add_done_callback(_log_failure)
+
+
+def schedule(post):
+    """Pre-generate thumbnails in the process pool after commit.
+
+    With ``THUMBNAIL_PREGENERATE_ASYNC = False`` they are created inline,
+    before anything can render the post.
+    """
+    if not settings.THUMBNAIL_PREGENERATE_ASYNC:
+        fields = pregenerate(post.pk, invalidate=False)
+        for name, value in (fields or {}).items():
+            setattr(post, name, value)
+        return
+    transaction.on_commit(lambda: _submit(post.pk))
@@ -0,0 +1,136 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+
+from core.sqlite import write_transaction
+
+from .models import Follow, Post, TimelineEntry
+from .pagination import paginate
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=1,
+                                       thread_name_prefix="timeline")
+    return _executor
+
+
+def _run(func, *args):
+    try:
+        func(*args)
+    except Exception:
+        logger.exception("Timeline task %s%r failed", func.__name__, args)
+    finally:
+        connections.close_all()
+
+
+def schedule(func, *args):
+    """Run ``func`` after commit on the background worker.
+
+    With ``TIMELINE_FANOUT_ASYNC = False`` the task runs inline instead.
+    """
+    if not settings.TIMELINE_FANOUT_ASYNC:
+        func(*args)
+        return
+    transaction.on_commit(
+        lambda: _get_executor().submit(_run, func, *args)
+    )
+
+
+def _insert_followed(where, params):
+    follow = connection.ops.quote_name(Follow._meta.db_table)
+    post = connection.ops.quote_name(Post._meta.db_table)
+    timeline = connection.ops.quote_name(TimelineEntry._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT OR IGNORE INTO {timeline} "
+            f"(user_id, post_id, author_id, pub_date) "
+            f"SELECT f.user_id, p.id, p.author_id, p.pub_date "
+            f"FROM {follow} f JOIN {post} p ON p.author_id = f.author_id "
+            f"WHERE {where}",
+            params
+        )
+
+
+def _insert_in_batches(ids, where, *params, batch_size=None):
+    """Add the entries of followed posts in batches of ``ids``.
+
+    ``where`` limits the join of follows and posts and ends with a range
+    that each batch fills with its first and last id. One short write
+    transaction runs per batch, so a prolific author does not hold the
+    write lock for the whole task. The follow is read in the same
+    transaction: a batch that commits after an unfollow adds nothing, and
+    one that commits before it is removed by the prune scheduled after
+    the unfollow, whichever process runs them.
+    """
+    batch_size = batch_size or settings.TIMELINE_FANOUT_BATCH_SIZE
+    ids = ids.iterator(chunk_size=batch_size)
+    while True:
+        batch = list(islice(ids, batch_size))
+        if not batch:
+            break
+        write_transaction(_insert_followed, where,
+                          [*params, batch[0], batch[-1]])
+
+
+def fan_out(post_id):
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        "author_id", flat=True
+    ).first()
+    if author_id is not None:
+        fan_out_posts(author_id, [post_id])
+
+
+def fan_out_posts(author_id, post_ids):
+    """Add posts of one author to the timelines of their followers.
+
+    Posts of the author with ids between those of ``post_ids`` are added
+    as well. Followers are taken in smaller batches the more posts there
+    are, so each transaction writes about TIMELINE_FANOUT_BATCH_SIZE rows.
+    """
+    followers = Follow.objects.filter(author_id=author_id).order_by(
+        "user_id"
+    ).values_list("user_id", flat=True)
+    _insert_in_batches(
+        followers, "f.author_id = %s AND p.id BETWEEN %s AND %s "
+                   "AND f.user_id BETWEEN %s AND %s",
+        author_id, min(post_ids), max(post_ids),
+        batch_size=max(settings.TIMELINE_FANOUT_BATCH_SIZE
+                       // len(post_ids), 1)
+    )
+
+
+def backfill(user_id, author_id):
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        "pk"
+    ).values_list("pk", flat=True)
+    _insert_in_batches(posts, "f.user_id = %s AND f.author_id = %s "
+                              "AND p.id BETWEEN %s AND %s",
+                       user_id, author_id)
+
+
+def prune(user_id, author_id):
+    write_transaction(TimelineEntry.objects.filter(
+        user_id=user_id, author_id=author_id
+    ).delete)
+
+
+def timeline_page(request):
+    entries = TimelineEntry.objects.filter(user=request.user).only(
+        "post_id", "pub_date"
+    )
+    page = paginate(request, entries, ordering=("-pub_date", "-post_id"))
+    posts = Post.objects.for_feed().in_bulk(
+        [entry.post_id for entry in page.object_list]
+    )
+    page.object_list = [posts[entry.post_id] for entry in page.object_list
+                        if entry.post_id in posts]
+    return page
@@ -1,43 +1,59 @@
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.urls import reverse
 from django.views.decorators.csrf import csrf_exempt
 
+from core.db_router import replica_reads
+from core.instrumentation import query_budget
+from core.sqlite import write_transaction
+
+from .feeds import follow_feed_page
 from .forms import CommentForm, PostForm
-from .models import Follow, Group, Post
+from .models import Comment, Follow, Group, Post
+from .page_cache import cache_by_generation, conditional_by_generation
+from .pagination import COMMENTS_PER_PAGE, dump_cursor, paginate
+from .search import search_page
+from .stats import author_header, with_author_header
 
 User = get_user_model()
 
 
 def paginator(request, post_list):
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
-    return page
+    return paginate(request, post_list)
 
 
-@cache_page(20, key_prefix="index_page")
+@replica_reads
+@query_budget(3)
+@cache_by_generation("index")
 def index(request):
-    post_list = Post.objects.all()
+    post_list = Post.objects.for_feed()
     page = paginator(request, post_list)
     return render(request, "index.html", {"page": page})
 
 
+@replica_reads
+@query_budget(4)
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
-    page = paginator(request, post_list)
+    page = follow_feed_page(request)
     return render(request, "follow.html", {"page": page, })
 
 
+@replica_reads
+@query_budget(5)
+def search(request):
+    query = request.GET.get("q", "").strip()
+    page = search_page(request, query)
+    return render(request, "search.html", {"page": page, "query": query})
+
+
 @login_required
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
-        Follow.objects.get_or_create(author_id=author.id,
-                                     user_id=request.user.id)
+        write_transaction(Follow.objects.get_or_create, author_id=author.id,
+                          user_id=request.user.id)
     return redirect("profile", username)
 
 
@@ -46,60 +62,90 @@ def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     author_following = author.following.get(user=request.user)
     if request.user != author:
-        author_following.delete()
+        # Collected again under the lock, so a concurrent unfollow is not
+        # counted twice.
+        write_transaction(
+            Follow.objects.filter(pk=author_following.pk).delete
+        )
     return redirect("profile", username)
 
 
+@replica_reads
+@query_budget(4)
+@cache_by_generation("group:{slug}")
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    post_list = group.posts.for_feed()
     page = paginator(request, post_list)
     return render(request, "group.html", {"page": page,
                                           "group": group})
 
 
+@replica_reads
+@query_budget(4)
+@cache_by_generation("profile:{username}")
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    posts_count = post_list.count()
+    author = get_object_or_404(
+        with_author_header(User.objects.all(), request.user),
+        username=username
+    )
+    post_list = author.posts.for_feed()
     page = paginator(request, post_list)
-    following = False
-    if request.user.is_authenticated:
-        if author.following.filter(user=request.user):
-            following = True
-    author_follower = author.follower.count()
-    author_following = author.following.count()
-    return render(
-        request,
-        "profile.html",
-        {"author": author,
-         "count": posts_count,
-         "page": page,
-         "following": following,
-         "author_follower": author_follower,
-         "author_following": author_following, }
+    return render(request, "profile.html",
+                  {**author_header(author, author), "page": page})
+
+
+def comments_page(request, post_id):
+    """A keyset page of a post's comments, oldest first, with authors."""
+    comments = Comment.objects.filter(post_id=post_id).select_related(
+        "author"
     )
+    return paginate(request, comments, COMMENTS_PER_PAGE,
+                    ordering=("created", "id"))
 
 
+@replica_reads
+@query_budget(4)
+@conditional_by_generation("profile:{username}")
 def post_view(request, username, post_id):
-    post = get_object_or_404(Post, author__username=username, pk=post_id)
+    post = get_object_or_404(
+        with_author_header(Post.objects.for_feed(), request.user,
+                           author="author__"),
+        author__username=username, pk=post_id
+    )
     form = CommentForm(request.POST or None)
-    comments = post.comments.all()
-    posts_count = post.author.posts.count()
+    comments = comments_page(request, post.pk)
     comment_button = False
-    author_follower = post.author.follower.count()
-    author_following = post.author.following.count()
-    return render(request, "post.html", {"author": post.author,
+    return render(request, "post.html", {**author_header(post, post.author),
                                          "post": post,
-                                         "count": posts_count,
                                          "form": form,
                                          "comments": comments,
                                          "comment_button": comment_button,
-                                         "author_follower": author_follower,
-                                         "author_following": author_following,
                                          })
 
 
+@replica_reads
+@query_budget(4)
+@conditional_by_generation("profile:{username}")
+def post_comments(request, username, post_id):
+    """The comments after the ``after`` cursor, as an HTML fragment."""
+    post = get_object_or_404(Post.objects.select_related("author"),
+                             author__username=username, pk=post_id)
+    return render(request, "includes/comment_list.html",
+                  {"post": post, "page": comments_page(request, post.pk)})
+
+
+def save_post(post):
+    """Save ``post`` through write_transaction.
+
+    A new image is stored first, so the upload is not written while the
+    database write lock is held.
+    """
+    if post.image and not post.image._committed:
+        post.image.save(post.image.name, post.image.file, save=False)
+    write_transaction(post.save)
+
+
 @login_required
 @csrf_exempt
 def new_post(request):
@@ -110,7 +156,7 @@ def new_post(request):
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        save_post(post)
         return redirect("index")
     return render(request, "new_post.html", {"form": form,
                                              "header": header,
@@ -129,7 +175,7 @@ def post_edit(request, username, post_id):
                     files=request.FILES or None,
                     instance=post)
     if form.is_valid():
-        post.save()
+        save_post(post)
         return redirect("post", username=post.author, post_id=post.id)
     return render(request, "new_post.html", {"form": form,
                                              "header": header,
@@ -146,8 +192,12 @@ def add_comment(request, username, post_id):
         comment = form.save(commit=False)
         comment.post = post
         comment.author = request.user
-        comment.save()
-        return redirect("post", username, post_id)
+        write_transaction(comment.save)
+        # Land on the page that ends with the new comment, however long
+        # the thread is.
+        cursor = dump_cursor([comment.created, comment.id + 1])
+        url = reverse("post", args=(username, post_id))
+        return redirect(f"{url}?before={cursor}#comment_{comment.id}")
     return render(request, "includes/comments.html", {"form": form})
 
 
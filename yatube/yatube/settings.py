@@ -38,6 +38,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "core.instrumentation.InstrumentationMiddleware",
+    "core.db_router.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -79,6 +81,31 @@ DATABASES = {
     }
 }
 
+# Aliases in DATABASES that hold read-only copies of "default". GET views
+# marked with replica_reads read from them, see core/db_router.py. After a
+# write a client stays on the primary for REPLICA_MAX_LAG seconds, and
+# pages read from a replica sooner than that after a change are neither
+# cached nor given validators.
+DATABASE_ROUTERS = ["core.db_router.ReplicaRouter"]
+DATABASE_REPLICAS = []
+REPLICA_MAX_LAG = 5
+
+# Several worker processes share db.sqlite3. Every SQLite connection is set
+# up with these pragmas, see core/sqlite.py: WAL lets readers run alongside
+# the writer, and busy_timeout (ms) makes a writer wait for the lock
+# instead of failing. Writes made through write_transaction take one write
+# lock per process and retry a still locked transaction SQLITE_WRITE_RETRIES
+# times, backing off from SQLITE_WRITE_BACKOFF seconds.
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "busy_timeout": 5000,
+}
+SQLITE_WRITE_GATE = True
+SQLITE_WRITE_RETRIES = 5
+SQLITE_WRITE_BACKOFF = 0.05
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -135,8 +162,81 @@ EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
 
+# Shared by every worker process on the host, see core/cache.py.
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "BACKEND": "core.cache.SQLiteCache",
+        "LOCATION": os.path.join(BASE_DIR, "cache.sqlite3"),
+        "OPTIONS": {
+            "MAX_ENTRIES": 100000,
+        },
     }
 }
+
+# Tests run against a throwaway cache file instead, see core/test_runner.py.
+TEST_RUNNER = "core.test_runner.TestRunner"
+
+
+# Follow feed engine:
+#   "timeline" - materialized per-user timeline filled by fan-out on write
+#                (migration 0020 fills it; run rebuild_timelines after
+#                switching back to it from another engine);
+#   "pull"     - k-way merge of cached per-author recent post lists;
+#   "join"     - plain Follow/Post join query.
+# Compare them with the bench_follow_feed command.
+
+FOLLOW_FEED_ENGINE = "timeline"
+
+# New posts are fanned out to followers' timelines, and follow/unfollow
+# copy or drop the author's posts, in a background thread after commit.
+TIMELINE_FANOUT_ASYNC = True
+TIMELINE_FANOUT_BATCH_SIZE = 1000
+
+RECENT_POSTS_LIMIT = 200
+RECENT_POSTS_TIMEOUT = 60 * 60 * 24
+
+# Rendered post cards are cached per post version, see posts/cards.py.
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Each process adds its card cache hits and misses to the shared counters
+# at most this often, in seconds.
+POST_CARD_STATS_FLUSH_INTERVAL = 60
+
+# index, group_posts and profile are cached until a write bumps their
+# generation counter, see posts/page_cache.py. Stale copies are served for
+# up to PAGE_CACHE_STALE_TIMEOUT more seconds while one worker rebuilds.
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+PAGE_CACHE_STALE_TIMEOUT = 60 * 60
+PAGE_CACHE_LOCK_TIMEOUT = 10
+PAGE_CACHE_EARLY_REFRESH_BETA = 1.0
+
+# Thumbnails of every geometry are created in a process pool right after a
+# post with an image is saved, see posts/thumbnails.py. Until then cards
+# show the original image.
+THUMBNAIL_GEOMETRIES = {
+    "960x339": {"crop": "center", "upscale": True},
+}
+# Every geometry is also encoded at these widths for srcset. sorl-thumbnail
+# 12.6 writes JPEG, PNG, GIF and WEBP only, so AVIF is not an option.
+THUMBNAIL_SRCSET_WIDTHS = (320, 640, 960)
+THUMBNAIL_SRCSET_FORMAT = "WEBP"
+# Inline blurred preview shown while the image loads.
+IMAGE_PLACEHOLDER_SIZE = 16
+IMAGE_PLACEHOLDER_QUALITY = 40
+THUMBNAIL_PREGENERATE_ASYNC = True
+# Images a post stops using are deleted by the sweep_images command, no
+# sooner than this many seconds after their release or last reuse.
+IMAGE_RELEASE_GRACE = 60 * 60
+THUMBNAIL_WORKERS = 2
+
+# Per-request SQL, template and cache counters with Server-Timing headers,
+# see core/instrumentation.py. Views over their query_budget are logged,
+# or raise QueryBudgetExceeded when QUERY_BUDGET_STRICT is set.
+REQUEST_INSTRUMENTATION = False
+INSTRUMENTATION_WINDOW = 1000
+QUERY_BUDGET_STRICT = False
+
+# Admin changelists count at most ADMIN_COUNT_LIMIT rows exactly and bulk
+# actions work through ADMIN_ACTION_CHUNK_SIZE rows at a time, see
+# posts/admin.py.
+ADMIN_COUNT_LIMIT = 10000
+ADMIN_ACTION_CHUNK_SIZE = 1000